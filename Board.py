@@ -0,0 +1,253 @@
+from Prefix_Index import Prefix_Index
+from Search_Index import Search_Index
+
+
+class Project:
+    """ A single project on the board
+
+    Contributors are kept in an insertion-ordered dict used as a set, so
+    membership checks are O(1) and iteration keeps the board order. The
+    rendered block of the project is cached and invalidated by every change,
+    which also bumps the project's revision. Changes to the description,
+    admin and contributors of a project on a board are also reported to the
+    board's indexes.
+    """
+    __slots__ = ('_name', '_description', '_admin', '_contributors', '_rendered', '_revision', '_board')
+
+    def __init__(self, name: str, description: str = '', admin: str = '', contributors=()):
+        self._name = name
+        self._description = description
+        self._admin = admin
+        self._contributors = dict.fromkeys(contributors)
+        self._rendered = None
+        self._revision = 0
+        self._board = None
+
+    def _changed(self):
+        self._rendered = None
+        self._revision += 1
+
+    @property
+    def revision(self) -> int:
+        """ Number of changes made to the project, telling apart its states without rendering it """
+        return self._revision
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, value: str):
+        self._name = value
+        self._changed()
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @description.setter
+    def description(self, value: str):
+        self._description = value
+        self._changed()
+        if self._board is not None:
+            self._board._search_index.add(self._name, value)
+
+    @property
+    def admin(self) -> str:
+        return self._admin
+
+    @admin.setter
+    def admin(self, value: str):
+        if self._board is not None:
+            self._board._unindex(self._board._admin_index, self._admin, self._name)
+            self._board._index(self._board._admin_index, value, self._name)
+        self._admin = value
+        self._changed()
+
+    @property
+    def contributors(self):
+        return self._contributors.keys()
+
+    def has_contributor(self, user_id: str) -> bool:
+        return user_id in self._contributors
+
+    def add_contributor(self, user_id: str) -> bool:
+        if user_id in self._contributors:
+            return False
+        self._contributors[user_id] = None
+        self._changed()
+        if self._board is not None:
+            self._board._index(self._board._member_index, user_id, self._name)
+        return True
+
+    def remove_contributor(self, user_id: str) -> bool:
+        if user_id not in self._contributors:
+            return False
+        del self._contributors[user_id]
+        self._changed()
+        if self._board is not None:
+            self._board._unindex(self._board._member_index, user_id, self._name)
+        return True
+
+    def render(self) -> str:
+        """ Render the project's block of the projects info message
+
+        :return: Cached rendered block
+        """
+        if self._rendered is None:
+            lines = [
+                f'## {self._name}',
+                f'  Description: {self._description}',
+                f'  Project Admin: <@{self._admin}>',
+                '  Project contributors:',
+            ]
+            for contributor in self._contributors:
+                lines.append(f'    👉 <@{contributor}>')
+            self._rendered = '\n'.join(lines)
+        return self._rendered
+
+    def __repr__(self):
+        return f'Project({self._name!r}, admin={self._admin!r}, contributors={list(self._contributors)!r})'
+
+
+class Board:
+    """ Ordered collection of projects keyed by name
+
+    Besides the prefix index over the names, the board keeps reverse indexes
+    from user ID to the names of the projects the user contributes to and
+    administers, in the order they joined, and a full-text search index over
+    names and descriptions. Projects report their own changes, so the indexes
+    stay current whichever way a project is changed.
+    """
+    __slots__ = ('_projects', '_prefix_index', '_member_index', '_admin_index', '_search_index')
+
+    def __init__(self, projects=()):
+        self._projects = {}
+        self._prefix_index = Prefix_Index()
+        self._member_index = {}
+        self._admin_index = {}
+        self._search_index = Search_Index()
+        for project in projects:
+            self.add(project)
+
+    def __contains__(self, name) -> bool:
+        return name in self._projects
+
+    def __iter__(self):
+        return iter(self._projects.values())
+
+    def __len__(self) -> int:
+        return len(self._projects)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Board):
+            return NotImplemented
+        return [project.render() for project in self] == [project.render() for project in other]
+
+    @staticmethod
+    def _index(index, user_id, name):
+        if user_id:
+            index.setdefault(user_id, {})[name] = None
+
+    @staticmethod
+    def _unindex(index, user_id, name):
+        names = index.get(user_id)
+        if names is not None:
+            names.pop(name, None)
+            if not names:
+                del index[user_id]
+
+    def _attach(self, project: Project):
+        project._board = self
+        self._search_index.add(project.name, project.description)
+        self._index(self._admin_index, project.admin, project.name)
+        for user_id in project.contributors:
+            self._index(self._member_index, user_id, project.name)
+
+    def _detach(self, project: Project):
+        self._unindex(self._admin_index, project.admin, project.name)
+        for user_id in project.contributors:
+            self._unindex(self._member_index, user_id, project.name)
+        self._search_index.remove(project.name)
+        project._board = None
+
+    def get(self, name):
+        return self._projects.get(name)
+
+    def names(self):
+        return self._projects.keys()
+
+    def add(self, project: Project):
+        replaced = self._projects.get(project.name)
+        if replaced is not None:
+            self._detach(replaced)
+        else:
+            self._prefix_index.add(project.name)
+        self._projects[project.name] = project
+        self._attach(project)
+
+    def remove(self, name):
+        project = self._projects.pop(name, None)
+        if project is not None:
+            self._prefix_index.remove(name)
+            self._detach(project)
+        return project
+
+    def projects_of(self, user_id: str):
+        """ Names of the projects a user contributes to, from the reverse index
+
+        :param user_id: Discord user ID
+        :return: List of project names
+        """
+        return list(self._member_index.get(user_id, ()))
+
+    def projects_administered_by(self, user_id: str):
+        """ Names of the projects a user is the admin of, from the reverse index
+
+        :param user_id: Discord user ID
+        :return: List of project names
+        """
+        return list(self._admin_index.get(user_id, ()))
+
+    def search(self, query: str, limit: int = 10):
+        """ Projects whose name or description matches a free text query, from the search index
+
+        :param query: Words to look for
+        :param limit: Maximum number of results
+        :return: List of (project name, score), best first
+        """
+        return self._search_index.search(query, limit)
+
+    def complete(self, prefix: str, limit: int = 25):
+        """ Project names with a word starting with the prefix, served from the prefix index
+
+        :param prefix: Typed prefix, matched case-insensitively
+        :param limit: Maximum number of names to return
+        :return: List of project names
+        """
+        return self._prefix_index.complete(prefix, limit)
+
+    def rename(self, name, new_name):
+        """ Rename a project, keeping its position on the board
+
+        :param name: Current project name
+        :param new_name: New project name, replacing any project already using it
+        :return: None
+        """
+        if new_name == name:
+            return
+        replaced = self._projects.get(new_name)
+        if replaced is not None:
+            self._detach(replaced)
+        project = self._projects[name]
+        self._detach(project)
+        project.name = new_name
+        self._attach(project)
+        self._prefix_index.remove(name)
+        if replaced is None:
+            self._prefix_index.add(new_name)
+        self._projects = {
+            (new_name if key == name else key): value
+            for key, value in self._projects.items()
+            if key != new_name
+        }
@@ -0,0 +1,77 @@
+from Projects_Info import Projects_Info
+from Request_Scheduler import Request_Scheduler
+
+
+class Board_Registry:
+    """ The projects info boards run by one bot process, keyed by guild and channel
+
+    Each board has its own Projects_Info, so its board, shards, store and
+    mutation queue are isolated from the others. The client, its gateway
+    connection and the request scheduler are shared by all boards.
+    """
+    def __init__(self, scheduler: Request_Scheduler = None):
+        self.scheduler = scheduler if scheduler is not None else Request_Scheduler()
+        self.boards = {}
+        self.guild_boards = {}
+
+    def __iter__(self):
+        return iter(self.boards.values())
+
+    def __len__(self) -> int:
+        return len(self.boards)
+
+    def add(self, guild_id: int, proj_info: Projects_Info):
+        """ Register a loaded board
+
+        :param guild_id: ID of the guild the board's channel belongs to
+        :param proj_info: Projects_Info of the board
+        :return: None
+        """
+        key = (guild_id, proj_info.channel_id)
+        if key in self.boards:
+            raise ValueError(f"Channel {proj_info.channel_id} already has a projects info board")
+        self.boards[key] = proj_info
+        self.guild_boards.setdefault(guild_id, []).append(proj_info)
+
+    def remove(self, guild_id: int, channel_id: int):
+        """ Unregister a board, e.g. when another process took over writing it
+
+        :return: Projects_Info of the board, or None if the channel has no board
+        """
+        proj_info = self.boards.pop((guild_id, channel_id), None)
+        if proj_info is not None:
+            self.guild_boards[guild_id].remove(proj_info)
+            if not self.guild_boards[guild_id]:
+                del self.guild_boards[guild_id]
+        return proj_info
+
+    def get(self, guild_id, channel_id):
+        """ Find the board in a channel
+
+        :return: Projects_Info, or None if the channel has no board
+        """
+        return self.boards.get((guild_id, channel_id))
+
+    def resolve(self, guild_id, channel_id=None):
+        """ Find the board a command used in a guild and channel refers to
+
+        A guild with several boards routes a command to the board of the
+        channel it was used in, and to its first board from other channels.
+
+        :param guild_id: Guild ID of the interaction, None in direct messages
+        :param channel_id: Channel ID of the interaction
+        :return: Projects_Info, or None if the guild has no board
+        """
+        proj_info = self.boards.get((guild_id, channel_id))
+        if proj_info is not None:
+            return proj_info
+        boards = self.guild_boards.get(guild_id)
+        return boards[0] if boards else None
+
+    async def close(self):
+        """ Stop every board's workers
+
+        :return: None
+        """
+        for proj_info in self:
+            await proj_info.close()
@@ -0,0 +1,128 @@
+import sqlite3
+from Board import Board, Project
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL DEFAULT '',
+    admin TEXT NOT NULL DEFAULT '',
+    position INTEGER NOT NULL,
+    shard_message_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS contributors (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (project_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS projects_position ON projects(position);
+CREATE INDEX IF NOT EXISTS projects_admin ON projects(admin);
+CREATE INDEX IF NOT EXISTS contributors_user ON contributors(user_id);
+"""
+
+
+class Board_Store:
+    """ SQLite store holding the authoritative copy of the board
+
+    Projects keep a global position, which is also the order in which they are
+    rendered across the shard messages, and the ID of the shard message they
+    were last written to. Shard message IDs are Discord snowflakes, so sorting
+    them gives the shard order back.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def is_empty(self) -> bool:
+        return self.connection.execute('SELECT 1 FROM projects LIMIT 1').fetchone() is None
+
+    def load_board(self):
+        """ Load the board and its shard layout
+
+        :return: (Board, list of (shard message ID or None, project names)) in board order.
+                 Projects never written to a shard are grouped under None.
+        """
+        contributors = {}
+        for project_id, user_id in self.connection.execute('SELECT project_id, user_id FROM contributors ORDER BY rowid'):
+            contributors.setdefault(project_id, []).append(user_id)
+
+        board = Board()
+        shards = {}
+        rows = self.connection.execute(
+            'SELECT id, name, description, admin, shard_message_id FROM projects ORDER BY position'
+        )
+        for project_id, name, description, admin, shard_message_id in rows:
+            board.add(Project(name, description, admin, contributors.get(project_id, ())))
+            shards.setdefault(shard_message_id, []).append(name)
+
+        layout = sorted((message_id, names) for message_id, names in shards.items() if message_id is not None)
+        if None in shards:
+            layout.append((None, shards[None]))
+        return board, layout
+
+    def import_board(self, board: Board, shards):
+        """ Replace the stored board, e.g. with one parsed from the projects info messages
+
+        :param board: Board to store
+        :param shards: List of Board_Shard objects holding the board
+        :return: None
+        """
+        shard_of = {proj: shard.message_id for shard in shards for proj in shard.projects}
+        with self.connection:
+            self.connection.execute('DELETE FROM projects')
+            for position, project in enumerate(board):
+                cursor = self.connection.execute(
+                    'INSERT INTO projects (name, description, admin, position, shard_message_id) VALUES (?, ?, ?, ?, ?)',
+                    (project.name, project.description, project.admin, position, shard_of.get(project.name))
+                )
+                self.connection.executemany(
+                    'INSERT INTO contributors (project_id, user_id) VALUES (?, ?)',
+                    [(cursor.lastrowid, user_id) for user_id in project.contributors]
+                )
+
+    def save_project(self, project: Project):
+        """ Insert or update a project, keeping the position of an existing one
+
+        :param project: Project to save
+        :return: None
+        """
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO projects (name, description, admin, position) '
+                'VALUES (?, ?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM projects)) '
+                'ON CONFLICT(name) DO UPDATE SET description = excluded.description, admin = excluded.admin',
+                (project.name, project.description, project.admin)
+            )
+            project_id = self.connection.execute('SELECT id FROM projects WHERE name = ?', (project.name,)).fetchone()[0]
+            self.connection.execute('DELETE FROM contributors WHERE project_id = ?', (project_id,))
+            self.connection.executemany(
+                'INSERT INTO contributors (project_id, user_id) VALUES (?, ?)',
+                [(project_id, user_id) for user_id in project.contributors]
+            )
+
+    def delete_project(self, name: str):
+        with self.connection:
+            self.connection.execute('DELETE FROM projects WHERE name = ?', (name,))
+
+    def rename_project(self, name: str, new_name: str):
+        with self.connection:
+            self.connection.execute('DELETE FROM projects WHERE name = ?', (new_name,))
+            self.connection.execute('UPDATE projects SET name = ? WHERE name = ?', (new_name, name))
+
+    def save_shards(self, shards):
+        """ Record which shard message each project of the given shards is rendered into
+
+        :param shards: Board_Shard objects that were just written
+        :return: None
+        """
+        with self.connection:
+            self.connection.executemany(
+                'UPDATE projects SET shard_message_id = ? WHERE name = ?',
+                [(shard.message_id, proj) for shard in shards for proj in shard.projects]
+            )
@@ -0,0 +1,144 @@
+import os
+import json
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Board_Config:
+    """ Location of one projects info board, its guild is that of the channel """
+    channel_id: int
+    message_id: Optional[int] = None
+    db_path: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Bot_Config:
+    """ Typed bot configuration, passed straight to bot.main when launching in-process
+
+    A single board is described by the projects_info_* fields and db_path.
+    Several boards are listed in `boards` instead, leaving those fields None.
+    """
+    token: str
+    projects_info_channel_id: Optional[int]
+    projects_info_message_id: Optional[int]
+    owner_user_id: int
+    db_path: Optional[str] = None
+    # Serve Prometheus metrics on this local port
+    metrics_port: Optional[int] = None
+    # Print a structured metrics log line every this many seconds
+    metrics_log_interval: Optional[float] = None
+    # Seconds a command may take before deferring its response
+    response_budget: float = 2.0
+    # Seconds a deferred command may take before the user is told it is still running
+    command_timeout: float = 30.0
+    boards: Tuple[Board_Config, ...] = ()
+    # Connect with minimal intents and caches, see bot.init_bot
+    low_memory: bool = False
+    # Trace Python allocations so memory reports list the largest allocation sites
+    trace_memory: bool = False
+    # Print a structured memory log line every this many seconds
+    memory_log_interval: Optional[float] = None
+    # Connect through discord.AutoShardedClient, with this many shards or as many as Discord recommends
+    sharded: bool = False
+    shard_count: Optional[int] = None
+    # Bot processes to run, each connecting its share of the shards
+    workers: int = 1
+    # Index of this process among the workers, set when the workers are started
+    worker_index: Optional[int] = None
+    # SQLite database the workers elect the writer of each board in
+    lease_path: str = '.board_leases.db'
+    # Seconds a board writer keeps its lease without renewing it, and so the longest a board waits for a new writer
+    lease_duration: float = 15.0
+
+    def __post_init__(self):
+        if self.workers < 1:
+            raise ValueError("Error: workers must be at least 1")
+        if self.workers > 1 and (self.shard_count is None or self.shard_count < self.workers):
+            raise ValueError("Error: Running several workers needs a shard_count of at least the number of workers")
+
+    @property
+    def metrics_enabled(self) -> bool:
+        return bool(self.metrics_port or self.metrics_log_interval)
+
+    @property
+    def board_configs(self) -> Tuple[Board_Config, ...]:
+        if self.boards:
+            return self.boards
+        return (Board_Config(self.projects_info_channel_id, self.projects_info_message_id, self.db_path),)
+
+    @property
+    def shard_ids(self) -> Optional[Tuple[int, ...]]:
+        """ Shards connected by this worker, None to connect them all """
+        if self.workers == 1 or self.worker_index is None:
+            return None
+        return tuple(range(self.worker_index, self.shard_count, self.workers))
+
+
+def parse_board_configs(entries) -> Tuple[Board_Config, ...]:
+    """
+    Build board configurations from a list of mappings with channel_id, message_id and db_path.
+    
+    :param entries: List of mappings, as read from YAML or JSON
+    :return: Tuple of Board_Config
+    """
+    boards = []
+    for entry in entries:
+        try:
+            channel_id = int(entry['channel_id'])
+            message_id = int(entry['message_id']) if entry.get('message_id') else None
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Error: Invalid board entry {entry!r}, expected a channel_id and optional message_id")
+        boards.append(Board_Config(channel_id, message_id, entry.get('db_path')))
+    channel_ids = [board.channel_id for board in boards]
+    if len(set(channel_ids)) != len(channel_ids):
+        raise ValueError("Error: Each board needs its own channel")
+    return tuple(boards)
+
+
+def config_from_env() -> Bot_Config:
+    """
+    Build a typed configuration from the environment variables set by set_environment_variables.
+    
+    :return: Bot_Config
+    """
+    token = os.getenv('DISCORD_TOKEN')
+    if token is None:
+        raise ValueError("Error: DISCORD_TOKEN environment variable not set.")
+
+    boards = ()
+    if os.getenv('PROJECTS_INFO_BOARDS'):
+        try:
+            boards = parse_board_configs(json.loads(os.getenv('PROJECTS_INFO_BOARDS')))
+        except (TypeError, ValueError):
+            raise ValueError("Error: PROJECTS_INFO_BOARDS environment variable invalid")
+
+    # The single board variables are only needed without PROJECTS_INFO_BOARDS
+    names = ('OWNER_USER_ID',) if boards else ('PROJECTS_INFO_CHANNEL_ID', 'PROJECTS_INFO_MESSAGE_ID', 'OWNER_USER_ID')
+    ids = {'PROJECTS_INFO_CHANNEL_ID': None, 'PROJECTS_INFO_MESSAGE_ID': None}
+    for name in names:
+        try:
+            ids[name] = int(os.getenv(name))
+        except (TypeError, ValueError):
+            raise ValueError(f"Error: {name} environment variable not set or invalid")
+
+    return Bot_Config(
+        token=token,
+        projects_info_channel_id=ids['PROJECTS_INFO_CHANNEL_ID'],
+        projects_info_message_id=ids['PROJECTS_INFO_MESSAGE_ID'],
+        owner_user_id=ids['OWNER_USER_ID'],
+        db_path=os.getenv('PROJECTS_DB_PATH'),
+        metrics_port=int(os.getenv('METRICS_PORT')) if os.getenv('METRICS_PORT') else None,
+        metrics_log_interval=float(os.getenv('METRICS_LOG_INTERVAL')) if os.getenv('METRICS_LOG_INTERVAL') else None,
+        response_budget=float(os.getenv('RESPONSE_BUDGET', Bot_Config.response_budget)),
+        command_timeout=float(os.getenv('COMMAND_TIMEOUT', Bot_Config.command_timeout)),
+        boards=boards,
+        low_memory=os.getenv('LOW_MEMORY') == '1',
+        trace_memory=os.getenv('TRACE_MEMORY') == '1',
+        memory_log_interval=float(os.getenv('MEMORY_LOG_INTERVAL')) if os.getenv('MEMORY_LOG_INTERVAL') else None,
+        sharded=os.getenv('SHARDED') == '1',
+        shard_count=int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None,
+        workers=int(os.getenv('WORKERS', Bot_Config.workers)),
+        lease_path=os.getenv('LEASE_PATH', Bot_Config.lease_path),
+        lease_duration=float(os.getenv('LEASE_DURATION', Bot_Config.lease_duration)),
+    )
@@ -0,0 +1,55 @@
+import asyncio
+
+
+class Edit_Scheduler:
+    """ Debounced writer that coalesces board mutations into one message edit
+
+    The first call to schedule() opens a window of `delay` seconds. Every
+    mutation scheduled inside that window shares the same flush, which renders
+    the latest board state once and writes it with a single edit. Flushes are
+    serialized so a later edit can never land before an earlier one.
+
+    A flush may instead queue its writes and return an awaitable for them,
+    which is waited on after the next flush is allowed to start. Keeping those
+    queued writes in order is then up to the queue.
+    """
+    def __init__(self, flush, delay: float = 0.5):
+        """
+        :param flush: Coroutine function that renders and writes the board,
+                      optionally returning an awaitable for queued writes
+        :param delay: Debounce window in seconds
+        """
+        self.flush = flush
+        self.delay = delay
+        self._pending = None
+        self._lock = asyncio.Lock()
+        # Flush tasks, referenced until they finish so they cannot be garbage collected
+        self._flushes = set()
+
+    def schedule(self) -> asyncio.Future:
+        """ Request a flush of the current board state
+
+        :return: Future resolved once an edit containing every mutation made
+                 before this call has been written
+        """
+        if self._pending is None:
+            self._pending = asyncio.get_running_loop().create_future()
+            flush = asyncio.create_task(self._flush_later(self._pending))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+        return self._pending
+
+    async def _flush_later(self, future: asyncio.Future):
+        await asyncio.sleep(self.delay)
+        try:
+            async with self._lock:
+                # Mutations from here on belong to the next flush
+                if self._pending is future:
+                    self._pending = None
+                queued = await self.flush()
+            if queued is not None:
+                await queued
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(None)
@@ -0,0 +1,190 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+import discord
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Message discord.http logs before sleeping on a 429
+RATE_LIMIT_LOG_FORMAT = 'We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.'
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Rate_Limit_Handler(logging.Handler):
+    """ Counts the 429s discord.py retries internally, which are otherwise only logged """
+    def __init__(self, metrics):
+        super().__init__(logging.WARNING)
+        self.metrics = metrics
+
+    def emit(self, record):
+        if record.msg == RATE_LIMIT_LOG_FORMAT and len(record.args) == 3:
+            method, url, retry_after = record.args
+            self.metrics.inc('discord_rate_limits_total', (('method', method),))
+            self.metrics.inc('discord_rate_limit_wait_seconds_total', (), retry_after)
+
+
+class Metrics:
+    """ Latency histograms and counters for commands and Discord API calls
+
+    Disabled by default. While disabled, command callbacks are registered
+    unwrapped and API calls only pay for one attribute check.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+        self.rate_limit_handler = None
+        self.log_task = None
+
+    def enable(self):
+        self.enabled = True
+        if self.rate_limit_handler is None:
+            self.rate_limit_handler = Rate_Limit_Handler(self)
+            logging.getLogger('discord.http').addHandler(self.rate_limit_handler)
+
+    def inc(self, name: str, labels=(), value: float = 1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels, seconds: float):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    async def track_api(self, route: str, awaitable):
+        """ Await a Discord API call, recording its latency and outcome
+
+        :param route: Label for the call, e.g. 'PATCH message'
+        :param awaitable: The API call
+        :return: Result of the call
+        """
+        if not self.enabled:
+            return await awaitable
+        labels = (('route', route),)
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        except discord.HTTPException as e:
+            self.inc('discord_api_errors_total', labels + (('status', str(e.status)),))
+            raise
+        finally:
+            self.observe('discord_api_seconds', labels, time.perf_counter() - started)
+
+    def instrument_command(self, callback):
+        """ Wrap a command callback to record its latency and errors
+
+        Commands registered while metrics are disabled are left unwrapped.
+
+        :param callback: Command callback
+        :return: Instrumented callback
+        """
+        if not self.enabled:
+            return callback
+        labels = (('command', callback.__name__),)
+
+        @functools.wraps(callback)
+        async def instrumented(interaction, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await callback(interaction, *args, **kwargs)
+            except Exception:
+                self.inc('command_errors_total', labels)
+                raise
+            finally:
+                self.observe('command_seconds', labels, time.perf_counter() - started)
+        return instrumented
+
+    def render_prometheus(self) -> str:
+        """ Render all metrics in the Prometheus text exposition format
+
+        :return: Exposition text
+        """
+        def label_text(labels, extra=()):
+            pairs = [f'{key}="{value}"' for key, value in labels + extra]
+            return '{' + ','.join(pairs) + '}' if pairs else ''
+
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f'{name}{label_text(labels)} {value}')
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{label_text(labels, (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_bucket{label_text(labels, (("le", "+Inf"),))} {histogram.count}')
+            lines.append(f'{name}_sum{label_text(labels)} {histogram.total}')
+            lines.append(f'{name}_count{label_text(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> dict:
+        """ Compact snapshot of the metrics for a structured log line
+
+        :return: Dict of counters and per-histogram count and mean in milliseconds
+        """
+        def key_text(name, labels):
+            return name + ''.join(f',{key}={value}' for key, value in labels)
+
+        return {
+            'counters': {key_text(name, labels): value for (name, labels), value in self.counters.items()},
+            'latency': {
+                key_text(name, labels): {'count': h.count, 'mean_ms': round(h.total / h.count * 1000, 2)}
+                for (name, labels), h in self.histograms.items() if h.count
+            },
+        }
+
+    async def serve_prometheus(self, port: int, host: str = '127.0.0.1'):
+        """ Serve the metrics at http://host:port/metrics
+
+        :param port: Local port
+        :param host: Interface to bind, local only by default
+        :return: aiohttp AppRunner, to be cleaned up on shutdown
+        """
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.render_prometheus(), content_type='text/plain')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    def start_logging(self, interval: float):
+        """ Print a structured JSON line with the metrics summary every `interval` seconds
+
+        :param interval: Seconds between log lines
+        :return: None
+        """
+        if self.log_task is None:
+            self.log_task = asyncio.create_task(self.log_periodically(interval))
+
+    async def log_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            print(json.dumps({'metrics': self.summary()}))
+
+
+# Shared by the command layer and Projects_Info
+metrics = Metrics()
@@ -0,0 +1,76 @@
+class Trie_Node:
+    __slots__ = ('children', 'names')
+
+    def __init__(self):
+        self.children = {}
+        self.names = set()
+
+
+class Prefix_Index:
+    """ Case-insensitive prefix index over project names
+
+    Each name is indexed under the whole name and under the start of every
+    word in it, so "ml" finds both "ML Club" and "Intro to ML".
+    """
+    __slots__ = ('root',)
+
+    def __init__(self, names=()):
+        self.root = Trie_Node()
+        for name in names:
+            self.add(name)
+
+    @staticmethod
+    def keys(name: str):
+        words = name.lower().split()
+        return {' '.join(words[i:]) for i in range(len(words))} | {name.lower()}
+
+    def add(self, name: str):
+        for key in self.keys(name):
+            node = self.root
+            for char in key:
+                node = node.children.setdefault(char, Trie_Node())
+            node.names.add(name)
+
+    def remove(self, name: str):
+        for key in self.keys(name):
+            path = [self.root]
+            for char in key:
+                node = path[-1].children.get(char)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                path[-1].names.discard(name)
+                # Prune nodes left without names or children
+                for depth in range(len(key), 0, -1):
+                    node = path[depth]
+                    if node.names or node.children:
+                        break
+                    del path[depth - 1].children[key[depth - 1]]
+
+    def complete(self, prefix: str, limit: int = 25):
+        """ Find names with a word starting with the prefix
+
+        :param prefix: Typed prefix, matched case-insensitively
+        :param limit: Maximum number of names to return
+        :return: At most `limit` names, shortest completions first
+        """
+        node = self.root
+        for char in prefix.lower().lstrip():
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        # Breadth-first, so shorter completions are found before longer ones
+        found = []
+        seen = set()
+        level = [node]
+        while level and len(found) < limit:
+            next_level = []
+            for node in level:
+                for name in sorted(node.names - seen):
+                    seen.add(name)
+                    found.append(name)
+                next_level.extend(node.children.values())
+            level = next_level
+        return found[:limit]
@@ -0,0 +1,166 @@
+import functools
+import itertools
+import discord
+from Board import Board, Project
+from Request_Scheduler import INTERACTION
+
+# Projects shown per page. With the field limits below a page stays well
+# within Discord's 6000 characters per embed.
+PROJECTS_PER_PAGE = 8
+FIELD_NAME_LENGTH = 200
+FIELD_VALUE_LENGTH = 500
+# Seconds a browser keeps answering its buttons after the last use
+BROWSER_TIMEOUT = 300.0
+
+
+def shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def join_mentions(user_ids, limit: int) -> str:
+    """ Mention users, cutting the list short to fit within `limit` characters
+
+    :return: Comma separated mentions, ending with a count of those left out
+    """
+    mentions = [f'<@{user_id}>' for user_id in user_ids]
+    text = ''
+    for i, mention in enumerate(mentions):
+        candidate = f'{text}, {mention}' if text else mention
+        more = f' and {len(mentions) - i - 1} more' if i + 1 < len(mentions) else ''
+        if len(candidate) + len(more) > limit:
+            return f'{text} and {len(mentions) - i} more' if text else f'{len(mentions)} members'
+        text = candidate
+    return text or 'none'
+
+
+def project_field(project: Project):
+    """ Render a project as the name and value of an embed field, within Discord's field limits
+
+    :return: (field name, field value)
+    """
+    description = shorten(project.description, FIELD_VALUE_LENGTH // 2) or '*No description*'
+    admin = f'Admin: <@{project.admin}>' if project.admin else 'Admin: none'
+    used = len(description) + len(admin) + len('\nContributors: \n')
+    contributors = 'Contributors: ' + join_mentions(project.contributors, FIELD_VALUE_LENGTH - used)
+    return shorten(project.name, FIELD_NAME_LENGTH), '\n'.join((description, admin, contributors))
+
+
+class Page_Cache:
+    """ Embeds of the board's pages, rendered on first view and kept until their projects change
+
+    A cached page is keyed by its projects and their revisions, which every
+    change to a project bumps. Comparing them tells whether a page is still
+    current without rendering anything, and a change only invalidates the page
+    holding the changed project, plus the pages after it when projects are
+    added or removed.
+    """
+    def __init__(self):
+        self.pages = {}
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    @staticmethod
+    def page_count(board: Board) -> int:
+        return max(1, -(-len(board) // PROJECTS_PER_PAGE))
+
+    def get(self, board: Board, page: int) -> discord.Embed:
+        """ Embed of one page of the board
+
+        :param board: Board to page through
+        :param page: Page index, clamped to the existing pages
+        :return: discord.Embed
+        """
+        count = self.page_count(board)
+        page = min(max(page, 0), count - 1)
+        projects = list(itertools.islice(board, page * PROJECTS_PER_PAGE, (page + 1) * PROJECTS_PER_PAGE))
+        key = tuple((project, project.revision) for project in projects)
+        cached = self.pages.get(page)
+        if cached is not None and len(cached[0]) == len(key) and all(
+                a is b and a_revision == b_revision for (a, a_revision), (b, b_revision) in zip(cached[0], key)):
+            embed = cached[1]
+        else:
+            embed = discord.Embed(title='Projects Info')
+            for project in projects:
+                name, value = project_field(project)
+                embed.add_field(name=name, value=value, inline=False)
+            if not projects:
+                embed.description = 'There are no projects yet.'
+            self.pages[page] = (key, embed)
+        # Drop pages the board no longer has
+        for stale in [index for index in self.pages if index >= count]:
+            del self.pages[stale]
+        return embed
+
+
+class Project_Browser(discord.ui.View):
+    """ Buttons paging through a board, answered from memory by the board's Page_Cache
+
+    Only the user who opened the browser can turn its pages.
+    """
+    def __init__(self, proj_info, user_id: int, page: int = 0, timeout: float = BROWSER_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.proj_info = proj_info
+        self.user_id = user_id
+        self.page = min(max(page, 0), self.page_count() - 1)
+        # Message the browser is on, set by bot_commands.respond once it is sent
+        self.message = None
+        self.update_buttons()
+
+    def page_count(self) -> int:
+        return Page_Cache.page_count(self.proj_info.board)
+
+    def embed(self) -> discord.Embed:
+        self.page = min(max(self.page, 0), self.page_count() - 1)
+        return self.proj_info.page_cache.get(self.proj_info.board, self.page)
+
+    def update_buttons(self):
+        count = self.page_count()
+        self.first_page.disabled = self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.last_page.disabled = self.page >= count - 1
+        # The position is shown on a button, so that the cached embeds do not depend on it
+        self.position.label = f'{self.page + 1} / {count}'
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id == self.user_id:
+            return True
+        await self.proj_info.scheduler.submit(INTERACTION, None, functools.partial(
+            interaction.response.send_message, 'Use /see_projects to browse the projects yourself.', ephemeral=True))
+        return False
+
+    async def show(self, interaction: discord.Interaction, page: int):
+        self.page = page
+        embed = self.embed()
+        self.update_buttons()
+        if self.message is None:
+            self.message = interaction.message
+        await self.proj_info.scheduler.submit(INTERACTION, None, functools.partial(
+            interaction.response.edit_message, embed=embed, view=self))
+
+    @discord.ui.button(label='«', style=discord.ButtonStyle.secondary)
+    async def first_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, 0)
+
+    @discord.ui.button(label='‹', style=discord.ButtonStyle.primary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label='1 / 1', style=discord.ButtonStyle.secondary, disabled=True)
+    async def position(self, interaction: discord.Interaction, button: discord.ui.Button):
+        pass
+
+    @discord.ui.button(label='›', style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
+
+    @discord.ui.button(label='»', style=discord.ButtonStyle.secondary)
+    async def last_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page_count() - 1)
+
+    async def on_timeout(self):
+        # The buttons stop working once the view times out, so they are removed
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
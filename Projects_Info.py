@@ -1,154 +1,895 @@
+import asyncio
+import collections
+import functools
 import discord
+from Board import Board, Project
+import board_io
+import board_format
+from board_format import MESSAGE_LIMIT, HEADER, CONTINUATION_HEADER
+from Edit_Scheduler import Edit_Scheduler
+from Metrics import metrics
+from Project_Browser import Page_Cache
+from Request_Scheduler import Request_Scheduler, BOARD_WRITE, BOARD_READ
+
+# The last shard is split and shards are merged only up to this size, leaving
+# slack so that a growing project rarely pushes projects into the next shards
+SHARD_FILL_TARGET = 1600
+# Content hashes remembered per shard message to recognise the bot's own edits
+KNOWN_HASHES = 4
+# Messages after the first shard searched for continuation shards on load
+CONTINUATION_SCAN_LIMIT = 1000
+
+
+def header_length(index):
+    # Headers are written followed by the schema version marker
+    return len(HEADER if index == 0 else CONTINUATION_HEADER) + len(board_format.SCHEMA_MARKER)
+
+
+class Board_Shard:
+    """ One message of the projects info board and the projects rendered into it """
+    def __init__(self, message_id=None, projects=None):
+        self.message_id = message_id
+        self.projects = projects if projects is not None else []
+        self.dirty = message_id is None
+
 
 class Projects_Info:
-    def __init__(self, client, channel_id: int, message_id: int):
+    """ In-memory model of the projects info board
+
+    The board is fetched and parsed once by load(). Reads are served from
+    memory and mutations are written through to Discord. Mutations landing
+    within `edit_delay` seconds of each other are coalesced into a single flush.
+
+    The board is split across an ordered set of shard messages in the projects
+    info channel. The configured message is always the first shard, and
+    continuation shards are bot messages starting with CONTINUATION_HEADER.
+    A flush only re-renders and edits the shards touched since the last one.
+
+    With a Board_Store the board is loaded from and persisted to SQLite, and
+    the shard messages become a view regenerated from the store.
+
+    REST calls go through a Request_Scheduler, shared with the command layer,
+    with the channel as their rate limit bucket.
+
+    The hashes of the last few contents written to or fetched from each shard
+    message are kept, so that gateway edit events for the shard messages can be
+    checked for drift without any REST call. See message_edited and message_deleted.
+
+    With a Writer_Lease, shared by bot processes on one machine, messages are
+    only sent, edited or deleted while this process holds the board's lease,
+    so no two processes ever write the same board.
+
+    The pages of the /see_projects browser are rendered from the board into
+    page_cache on first view, and kept until their projects change.
+
+    A mutation that would make a project's block too long for one message
+    raises ValueError before changing anything, see board_format.check_block_length.
+    """
+    def __init__(self, client, channel_id: int, message_id: int, edit_delay: float = 0.5, store=None,
+                 scheduler: Request_Scheduler = None, lease=None):
         self.client = client
         self.channel_id = channel_id
         self.message_id = message_id
+        self.store = store
+        self.scheduler = scheduler if scheduler is not None else Request_Scheduler()
+        self.bucket = f'channel {channel_id}'
+        self.lease = lease
+        self.board = Board()
+        self.shards = [Board_Shard(message_id)]
+        self.shard_of = {}
+        self.deleted_message_ids = []
+        self.known_hashes = {}
+        self.page_cache = Page_Cache()
+        self.edit_scheduler = Edit_Scheduler(self.write_projects, edit_delay)
+        self.mutations = asyncio.Queue()
+        self.mutation_worker = None
 
-    async def get_message(self):
+    def get_channel(self):
         channel = self.client.get_channel(self.channel_id)
         if channel is None:
             raise ValueError(f"Channel with ID {self.channel_id} not found")
+        return channel
+
+    async def get_message(self):
+        channel = self.get_channel()
         try:
-            message = await channel.fetch_message(self.message_id)
+            message = await self.scheduler.submit(
+                BOARD_READ, self.bucket, lambda: metrics.track_api('GET message', channel.fetch_message(self.message_id)))
             return message
         except discord.NotFound:
             raise ValueError(f"Message with ID {self.message_id} not found in channel {self.channel_id}")
         except discord.Forbidden:
             raise ValueError(f"Bot does not have permission to access message with ID {self.message_id} in channel {self.channel_id}")
 
-    async def update_message(self, new_content):
+    async def get_shard_messages(self):
+        """ Fetch the first shard and discover the continuation shards after it
+
+        :return: List of shard messages in board order
+        """
         message = await self.get_message()
-        await message.edit(content=new_content)
+        if message.author.id != self.client.user.id:
+            raise ValueError(f"Message with ID {self.message_id} was not sent by the bot and cannot be edited")
+        later = await self.scheduler.submit(
+            BOARD_READ, self.bucket, lambda: metrics.track_api('GET history', self.get_continuation_messages(message)))
+        return [message] + later
+
+    async def get_continuation_messages(self, first):
+        messages = []
+        async for later in self.get_channel().history(after=first, limit=CONTINUATION_SCAN_LIMIT, oldest_first=True):
+            if later.author.id == self.client.user.id and later.content.startswith(CONTINUATION_HEADER):
+                messages.append(later)
+        return messages
+
+    async def fetch_board(self):
+        """ Fetch the shard messages and parse the board out of them
+
+        Shards written by an older layout are marked dirty, so that the next
+        flush rewrites them in the current one.
 
-    async def verify_message_editable(self):
+        :return: (Board, list of Board_Shard)
+        """
+        board = Board()
+        shards = []
+        for message in await self.get_shard_messages():
+            self.remember_content(message.id, message.content)
+            shard = Board_Shard(message.id)
+            parsed, version = board_format.parse_board(message.content)
+            # A name repeated within a message keeps its last block, and one repeated across shards its first
+            for project in {project.name: project for project in parsed}.values():
+                if project.name not in board:
+                    board.add(project)
+                    shard.projects.append(project.name)
+            shard.dirty = version < board_format.SCHEMA_VERSION
+            shards.append(shard)
+        return board, shards
+
+    def read_store(self):
+        """ Read the board from the store
+
+        :return: (Board, list of Board_Shard)
+        """
+        board, layout = self.store.load_board()
+        shards = [Board_Shard(message_id, names) for message_id, names in layout]
+        if not shards or shards[0].message_id != self.message_id:
+            shards.insert(0, Board_Shard(self.message_id))
+        return board, shards
+
+    async def mark_stale_shards(self, board, shards):
+        """ Mark the shards whose message does not show their projects as read from the store
+
+        The shard messages are fetched and compared with their render, so that
+        a restart only rewrites the messages that drifted from the store.
+
+        :param board: Board read from the store
+        :param shards: Board_Shard list read from the store
+        :return: None
+        """
         try:
-            message = await self.get_message()
-            await message.edit(content=message.content)
+            messages = {message.id: message for message in await self.get_shard_messages()}
+        except ValueError:
+            messages = {}
+        for index, shard in enumerate(shards):
+            message = messages.get(shard.message_id)
+            if message is None:
+                shard.dirty = True
+                continue
+            self.remember_content(message.id, message.content)
+            header = HEADER if index == 0 else CONTINUATION_HEADER
+            shard.dirty = message.content != self.format_message_content(
+                (board.get(proj) for proj in shard.projects), header)
+
+    async def load(self, regenerate_legacy=True, write_pending=True):
+        """ Rebuild the in-memory board
+
+        Without a store, or with an empty one, the board is parsed from the shard
+        messages, and imported into the store once if there is one. Otherwise it
+        is read from the store, and the shard messages that differ from it are
+        regenerated. Shard messages in an older layout are regenerated either way.
+
+        :param regenerate_legacy: Whether shards in an older layout are rewritten right away.
+                                  If not, they are left dirty for the next flush.
+        :param write_pending: Whether mutations still waiting on their flush are written before
+                              the board is replaced. If not, they are dropped with the old board.
+        :return: None
+        """
+        while True:
+            if self.store is not None and not self.store.is_empty():
+                loaded, shards = self.read_store()
+                await self.mark_stale_shards(loaded, shards)
+                regenerate = any(shard.dirty for shard in shards)
+            else:
+                loaded, shards = await self.fetch_board()
+                if self.store is not None:
+                    self.store.import_board(loaded, shards)
+                regenerate = regenerate_legacy and any(shard.dirty for shard in shards)
+            replaced = False
+
+            def apply(board):
+                nonlocal replaced
+                if write_pending and any(shard.dirty for shard in self.shards):
+                    # Replacing the board would lose these mutations while their callers are told
+                    # they were written. Flush them instead, then read the board again.
+                    return True
+                replaced = True
+                self.board = loaded
+                self.shards = shards
+                self.shard_of = {proj: shard for shard in shards for proj in shard.projects}
+                # Returning False skips the flush when memory already matches the messages
+                return regenerate
+
+            await self.mutate(apply)
+            if replaced:
+                return
+
+    def remember_content(self, message_id, content):
+        hashes = self.known_hashes.get(message_id)
+        if hashes is None:
+            hashes = self.known_hashes[message_id] = collections.deque(maxlen=KNOWN_HASHES)
+        hashes.append(hash(content))
+
+    def check_lease(self):
+        # Checked right before each write, as queued writes can run long after they were flushed
+        if self.lease is not None and not self.lease.held():
+            raise ValueError(f"This process no longer holds the writer lease of the board in channel {self.channel_id}")
+
+    async def edit_message(self, message_id, new_content):
+        self.check_lease()
+        # Remembered before the edit, as its gateway event can arrive before the response
+        self.remember_content(message_id, new_content)
+        # A partial message lets us edit without fetching the message first
+        message = self.get_channel().get_partial_message(message_id)
+        try:
+            await metrics.track_api('PATCH message', message.edit(content=new_content))
+        except discord.NotFound:
+            raise ValueError(f"Message with ID {message_id} not found in channel {self.channel_id}")
+        except discord.Forbidden:
+            raise ValueError(f"Bot does not have permission to edit message with ID {message_id} in channel {self.channel_id}")
+
+    async def send_message(self, content):
+        self.check_lease()
+        message = await metrics.track_api('POST message', self.get_channel().send(content))
+        self.remember_content(message.id, content)
+        return message
+
+    async def delete_message(self, message_id):
+        self.check_lease()
+        self.known_hashes.pop(message_id, None)
+        try:
+            await metrics.track_api('DELETE message', self.get_channel().get_partial_message(message_id).delete())
+        except discord.NotFound:
+            # Already gone, e.g. removed by the same bulk delete as the shard before it
+            pass
+
+    def shard_index(self, message_id):
+        for index, shard in enumerate(self.shards):
+            if shard.message_id == message_id:
+                return index
+        return None
+
+    async def message_edited(self, message_id, content):
+        """ Handle a gateway edit event for a message in the channel
+
+        Edits whose content hashes to something the bot wrote or fetched
+        are ignored. Otherwise a shard message was edited out of band: without
+        a store the board is reloaded from the messages, and with one the
+        shard is rewritten from the store. Mutations still waiting on their
+        flush are written before the reload, overwriting the edit if they
+        changed the same shard.
+
+        :param message_id: ID of the edited message
+        :param content: New content, None if the edit did not change it
+        :return: True if the board drifted and was reloaded or repaired
+        """
+        if content is None or self.shard_index(message_id) is None:
+            return False
+        if hash(content) in self.known_hashes.get(message_id, ()):
+            return False
+
+        if self.store is None:
+            print(f"Projects info message {message_id} was edited outside the bot, reloading the board")
+            await self.load()
             return True
-        except (discord.NotFound, discord.Forbidden, ValueError):
+
+        print(f"Projects info message {message_id} was edited outside the bot, rewriting it")
+
+        def apply(_):
+            index = self.shard_index(message_id)
+            if index is None:
+                return False
+            self.shards[index].dirty = True
+
+        await self.mutate(apply)
+        return True
+
+    async def message_deleted(self, message_ids):
+        """ Handle a gateway delete event for messages in the channel
+
+        Shard messages deleted out of band are sent again from memory, along
+        with every shard after the first of them, whose old messages are deleted,
+        so the shard messages stay in board order. Deleting the first shard gives
+        the board a new configured message ID.
+
+        :param message_ids: IDs of the deleted messages, every ID of a bulk delete at once
+        :return: True if a shard message was deleted and is being sent again
+        """
+        message_ids = {message_id for message_id in message_ids if self.shard_index(message_id) is not None}
+        if not message_ids:
             return False
+        for message_id in message_ids:
+            self.known_hashes.pop(message_id, None)
 
-    def parse_message_content(self, content):
-        projects = {}
-        current_proj = None
-
-        for line in content.split('\n'):
-            if line.startswith('## '):
-                current_proj = line[3:].strip()
-                projects[current_proj] = {'Description': '', 'Admin': '', 'Contributors': []}
-            elif line.strip().startswith('Description:'):
-                projects[current_proj]['Description'] = line.split('Description: ', 1)[1].strip()
-            elif line.strip().startswith('Project Admin:'):
-                projects[current_proj]['Admin'] = line.split('Project Admin: <@', 1)[1][:-1].strip()
-            elif line.strip().startswith('👉 <@'):
-                projects[current_proj]['Contributors'].append(line.split('👉 <@', 1)[1][:-1].strip())
-
-        return projects
-
-    def format_message_content(self, projects):
-        lines = ['# **Projects Info**']
-        for proj, details in projects.items():
-            lines.append(f'## {proj}')
-            lines.append(f'  Description: {details["Description"]}')
-            lines.append(f'  Project Admin: <@{details["Admin"]}>')
-            lines.append('  Project contributors:')
-            for contributor in details['Contributors']:
-                lines.append(f'    👉 <@{contributor}>')
-
-        return '\n'.join(lines)
+        def apply(_):
+            indexes = [index for index, shard in enumerate(self.shards) if shard.message_id in message_ids]
+            if not indexes:
+                return False
+            for shard in self.shards[min(indexes):]:
+                if shard.message_id is not None and shard.message_id not in message_ids:
+                    self.deleted_message_ids.append(shard.message_id)
+                shard.message_id = None
+                shard.dirty = True
 
-    async def update_proj_desc(self, proj, new_desc):
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
+        deleted = ', '.join(str(message_id) for message_id in sorted(message_ids))
+        print(f"Projects info messages {deleted} were deleted outside the bot, sending them again")
+        await self.mutate(apply)
+        if self.shards[0].message_id != self.message_id:
+            self.message_id = self.shards[0].message_id
+            print(f"Projects info message recreated with ID {self.message_id}. Update the message ID of channel {self.channel_id} in the configuration file.")
+        return True
+
+    async def update_message(self):
+        """ Schedule a coalesced write of the board and wait until it is flushed
+
+        :return: None
+        """
+        await self.edit_scheduler.schedule()
+
+    def project_changed(self, proj):
+        """ Record a change to a project: persist it and mark its shard for a re-render
+
+        Projects not yet on the board are placed in the last shard.
+
+        :param proj: Project name
+        :return: None
+        """
+        if self.store is not None:
+            self.store.save_project(self.board.get(proj))
+        shard = self.shard_of.get(proj)
+        if shard is None:
+            shard = self.shards[-1]
+            shard.projects.append(proj)
+            self.shard_of[proj] = shard
+        shard.dirty = True
+
+    def project_removed(self, proj):
+        if self.store is not None:
+            self.store.delete_project(proj)
+        shard = self.shard_of.pop(proj, None)
+        if shard is not None:
+            shard.projects.remove(proj)
+            shard.dirty = True
+
+    def project_renamed(self, proj, new_name):
+        if self.store is not None:
+            self.store.rename_project(proj, new_name)
+        shard = self.shard_of.pop(proj)
+        shard.projects[shard.projects.index(proj)] = new_name
+        self.shard_of[new_name] = shard
+        shard.dirty = True
+
+    def render_shard(self, index):
+        header = HEADER if index == 0 else CONTINUATION_HEADER
+        return self.format_message_content((self.board.get(proj) for proj in self.shards[index].projects), header)
+
+    def shard_length(self, index, projects):
+        """ Length of a shard's content without joining it, using the cached project blocks
+
+        :param index: Shard index, which decides the header
+        :param projects: Project names that would be rendered into the shard
+        :return: Length of the rendered content
+        """
+        return header_length(index) + sum(len(self.board.get(proj).render()) + 1 for proj in projects)
+
+    def shard_fit(self, index, projects, limit):
+        """ Count the leading projects that fit in a shard within `limit` characters
+
+        A first project that does not fit under MESSAGE_LIMIT on its own cannot be written at all.
+
+        :return: Number of projects, at least one
+        """
+        length = header_length(index)
+        for count, proj in enumerate(projects):
+            length += len(self.board.get(proj).render()) + 1
+            if length > limit:
+                if count == 0 and length > MESSAGE_LIMIT:
+                    raise ValueError(f"Project {proj} is too long to fit in a single message")
+                return max(count, 1)
+        return len(projects)
+
+    def lay_out_shards(self):
+        """ Spread the whole board over the shards afresh, filling each up to SHARD_FILL_TARGET
+
+        Existing shard messages are reused in order, and those left over are
+        emptied and dropped by the next flush. Used when most of the board changes at once.
+
+        :return: None
+        """
+        for shard in self.shards:
+            shard.projects = []
+            shard.dirty = True
+        index = 0
+        length = header_length(0)
+        for project in self.board:
+            block = len(project.render()) + 1
+            if self.shards[index].projects and length + block > SHARD_FILL_TARGET:
+                index += 1
+                if index == len(self.shards):
+                    self.shards.append(Board_Shard())
+                length = header_length(index)
+            self.shards[index].projects.append(project.name)
+            length += block
+        self.shard_of = {proj: shard for shard in self.shards for proj in shard.projects}
+
+    def rebalance_shards(self):
+        """ Render the dirty shards, splitting, merging and dropping shards as needed
+
+        A shard over MESSAGE_LIMIT pushes its trailing projects to the next shard,
+        and the last shard starts a new one once it grows past SHARD_FILL_TARGET.
+        A dirty shard folds into the previous one, or else absorbs the next one,
+        when both fit under SHARD_FILL_TARGET, and empty continuation shards are
+        dropped, so the board takes fewer messages as it shrinks.
+
+        A project too long for any message raises ValueError, and leaves every
+        shard rendered so far dirty for the next flush.
+
+        :return: List of (shard, content) pairs to write
+        """
+        writes = {}
+        try:
+            self.rebalance_dirty_shards(writes)
+        except ValueError:
+            for shard in writes:
+                shard.dirty = True
+            raise
+        return list(writes.items())
+
+    def rebalance_dirty_shards(self, writes):
+        index = 0
+        while index < len(self.shards):
+            shard = self.shards[index]
+            if not shard.dirty:
+                index += 1
+                continue
+
+            if index > 0 and not shard.projects:
+                del self.shards[index]
+                writes.pop(shard, None)
+                if shard.message_id is not None:
+                    self.deleted_message_ids.append(shard.message_id)
+                # The previous shard may now be able to absorb the next one
+                index -= 1
+                self.shards[index].dirty = True
+                continue
+
+            if index > 0:
+                previous = self.shards[index - 1]
+                if self.shard_length(index - 1, previous.projects + shard.projects) <= SHARD_FILL_TARGET:
+                    # Fold into the previous shard, which is rendered again and may in turn fold into its own
+                    for proj in shard.projects:
+                        self.shard_of[proj] = previous
+                    previous.projects.extend(shard.projects)
+                    shard.projects = []
+                    previous.dirty = True
+                    index -= 1
+                    continue
+
+            if index + 1 < len(self.shards):
+                following = self.shards[index + 1]
+                if self.shard_length(index, shard.projects + following.projects) <= SHARD_FILL_TARGET:
+                    for proj in following.projects:
+                        self.shard_of[proj] = shard
+                    shard.projects.extend(following.projects)
+                    following.projects = []
+                    following.dirty = True
+
+            limit = SHARD_FILL_TARGET if index + 1 == len(self.shards) else MESSAGE_LIMIT
+            keep = self.shard_fit(index, shard.projects, limit)
+            if keep < len(shard.projects):
+                if index + 1 == len(self.shards):
+                    self.shards.append(Board_Shard())
+                following = self.shards[index + 1]
+                pushed = shard.projects[keep:]
+                del shard.projects[keep:]
+                following.projects[:0] = pushed
+                following.dirty = True
+                for proj in pushed:
+                    self.shard_of[proj] = following
 
-        if proj in projects:
-            projects[proj]['Description'] = new_desc
+            shard.dirty = False
+            writes[shard] = self.render_shard(index)
+            index += 1
+
+    async def write_projects(self):
+        """ Write the dirty shards of the in-memory board through to Discord
+
+        New shards are sent before returning. Edits of existing shards are queued
+        with the request scheduler, where a newer edit of the same message replaces
+        one still waiting for its turn, and removed shards are deleted once the
+        edits have landed. Waiting for those is left to the returned coroutine, so
+        the next flush can be rendered in the meantime.
+
+        If a write fails the board is reloaded so memory never drifts from Discord.
+        With a store, which stays authoritative, the shards are retried by the next flush instead.
+
+        With a lease, it is renewed first, and nothing is written if another process took it over.
+
+        :return: Coroutine waiting for the queued edits and deletions
+        """
+        if self.lease is not None and not self.lease.acquire():
+            raise ValueError(f"The board in channel {self.channel_id} is now written by {self.lease.current_holder()}")
+        writes = self.rebalance_shards()
+        deleted, self.deleted_message_ids = self.deleted_message_ids, []
+        edits = []
+        try:
+            for shard, content in writes:
+                if shard.message_id is None:
+                    message = await self.scheduler.submit(BOARD_WRITE, self.bucket,
+                                                          functools.partial(self.send_message, content))
+                    shard.message_id = message.id
+                else:
+                    edits.append(self.scheduler.enqueue(
+                        BOARD_WRITE, self.bucket, functools.partial(self.edit_message, shard.message_id, content),
+                        supersede_key=('edit', shard.message_id)))
+        except (discord.HTTPException, ValueError):
+            await asyncio.gather(*edits, return_exceptions=True)
+            await self.write_failed(writes)
+            raise
+        finally:
+            if self.store is not None:
+                self.store.save_shards([shard for shard, _ in writes if shard.message_id is not None])
+        return self.finish_writes(writes, edits, deleted)
+
+    async def finish_writes(self, writes, edits, deleted):
+        """ Wait for the edits queued by write_projects, then delete the removed shards
+
+        :param writes: (shard, content) pairs of the flush
+        :param edits: Futures of the queued edits
+        :param deleted: Message IDs of the removed shards
+        :return: None
+        """
+        try:
+            for result in await asyncio.gather(*edits, return_exceptions=True):
+                if isinstance(result, Exception):
+                    raise result
+            for message_id in deleted:
+                await self.scheduler.submit(BOARD_WRITE, self.bucket, functools.partial(self.delete_message, message_id))
+        except (discord.HTTPException, ValueError):
+            await self.write_failed(writes)
+            raise
+
+    async def write_failed(self, writes):
+        if self.store is None:
+            # Reloading must not flush again, or writes failing for good would be retried
+            # forever, and a flush waited on here could not start while this one holds the lock
+            await self.load(regenerate_legacy=False, write_pending=False)
         else:
-            projects[proj] = {'Description': new_desc, 'Admin': '', 'Contributors': []}
+            for shard, _ in writes:
+                shard.dirty = True
 
-        new_content = self.format_message_content(projects)
-        await self.update_message(new_content)
-    
-    async def update_proj_name(self, proj, new_name) -> bool:
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
-        if not await self.project_exists(proj):
+    async def close(self):
+        """ Stop the mutation worker and the request scheduler
+
+        :return: None
+        """
+        await self.stop()
+        await self.scheduler.close()
+
+    async def stop(self):
+        """ Stop the mutation worker, leaving the request scheduler shared with other boards running
+
+        :return: None
+        """
+        if self.mutation_worker is not None:
+            self.mutation_worker.cancel()
+            try:
+                await self.mutation_worker
+            except asyncio.CancelledError:
+                pass
+            self.mutation_worker = None
+
+    def verify_permissions(self) -> bool:
+        """ Check from the cached guild state, without any API call, that the bot can manage the board
+
+        :return: True if the bot can read, send and edit its messages in the channel
+        """
+        channel = self.client.get_channel(self.channel_id)
+        if channel is None:
             return False
-        projects[new_name] = projects.pop(proj)
-        new_content = self.format_message_content(projects)
-        await self.update_message(new_content)
-        return True
+        permissions = channel.permissions_for(channel.guild.me)
+        return permissions.view_channel and permissions.send_messages and permissions.read_message_history
+
+    def parse_message_content(self, content) -> Board:
+        return Board(board_format.parse_board(content)[0])
+
+    def format_message_content(self, projects, header=HEADER):
+        """ Render projects into message content from their cached blocks
+
+        :param projects: Iterable of Project objects, e.g. a Board
+        :param header: First line of the message, followed by the schema version marker
+        :return: Message content
+        """
+        return '\n'.join([header + board_format.SCHEMA_MARKER] + [project.render() for project in projects])
+
+    async def mutate(self, apply):
+        """ Submit a mutation to the single board writer and wait for it to be flushed
+
+        Mutations are applied to the board strictly in submission order by one
+        worker task, so concurrent commands can never overwrite each other.
+        Reads do not go through the queue and keep running concurrently.
+
+        :param apply: Function taking the Board and mutating it in place.
+                      Returning False marks the mutation as a no-op and skips the edit.
+        :return: The value returned by apply
+        """
+        if self.mutation_worker is None or self.mutation_worker.done():
+            self.mutation_worker = asyncio.create_task(self.apply_mutations())
+        future = asyncio.get_running_loop().create_future()
+        await self.mutations.put((apply, future))
+        result, flushed = await future
+        if flushed is not None:
+            await flushed
+        return result
+
+    async def apply_mutations(self):
+        while True:
+            apply, future = await self.mutations.get()
+            try:
+                result = apply(self.board)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            flushed = None if result is False else self.edit_scheduler.schedule()
+            future.set_result((result, flushed))
+
+    async def update_proj_desc(self, proj, new_desc):
+        def apply(board):
+            project = board.get(proj)
+            if project is not None:
+                board_format.check_block_length(Project(proj, new_desc, project.admin, project.contributors))
+                project.description = new_desc
+            else:
+                project = Project(proj, description=new_desc)
+                board_format.check_block_length(project)
+                board.add(project)
+            self.project_changed(proj)
+
+        await self.mutate(apply)
+
+    async def create_project(self, proj, admin_id) -> bool:
+        admin_id = str(admin_id)
+
+        def apply(board):
+            if proj in board:
+                return False  # Project already exists
+            project = Project(proj, admin=admin_id, contributors=[admin_id])
+            board_format.check_block_length(project)
+            board.add(project)
+            self.project_changed(proj)
+            return True
+
+        return await self.mutate(apply)
+
+    async def update_proj_name(self, proj, new_name) -> bool:
+        if new_name == proj:
+            return await self.project_exists(proj)
+
+        def apply(board):
+            project = board.get(proj)
+            if project is None:
+                return False
+            board_format.check_block_length(Project(new_name, project.description, project.admin, project.contributors))
+            if new_name in board:
+                self.project_removed(new_name)
+            board.rename(proj, new_name)
+            self.project_renamed(proj, new_name)
+            return True
+
+        return await self.mutate(apply)
 
     async def update_proj_admin(self, proj, new_admin_id):
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
+        new_admin_id = str(new_admin_id)
 
-        if proj in projects:
-            projects[proj]['Admin'] = new_admin_id
-            if new_admin_id not in projects[proj]['Contributors']:
-                projects[proj]['Contributors'].append(new_admin_id)
-        else:
-            projects[proj] = {'Description': '', 'Admin': new_admin_id, 'Contributors': [new_admin_id]}
+        def apply(board):
+            project = board.get(proj)
+            if project is not None:
+                board_format.check_block_length(
+                    Project(proj, project.description, new_admin_id, [*project.contributors, new_admin_id]))
+                project.admin = new_admin_id
+                project.add_contributor(new_admin_id)
+            else:
+                project = Project(proj, admin=new_admin_id, contributors=[new_admin_id])
+                board_format.check_block_length(project)
+                board.add(project)
+            self.project_changed(proj)
 
-        new_content = self.format_message_content(projects)
-        await self.update_message(new_content)
+        await self.mutate(apply)
 
     async def add_proj_contributor(self, proj, contributor_id):
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
+        contributor_id = str(contributor_id)
 
-        if proj in projects:
-            if str(contributor_id) not in projects[proj]['Contributors']:
-                projects[proj]['Contributors'].append(contributor_id)
+        def apply(board):
+            project = board.get(proj)
+            if project is not None:
+                if project.has_contributor(contributor_id):
+                    return False  # Contributor already exists
+                board_format.check_block_length(
+                    Project(proj, project.description, project.admin, [*project.contributors, contributor_id]))
+                project.add_contributor(contributor_id)
             else:
-                return False  # Contributor already exists
-        else:
-            projects[proj] = {'Description': '', 'Admin': '', 'Contributors': [contributor_id]}
+                project = Project(proj, contributors=[contributor_id])
+                board_format.check_block_length(project)
+                board.add(project)
+            self.project_changed(proj)
+            return True
 
-        new_content = self.format_message_content(projects)
-        await self.update_message(new_content)
-        return True
+        return await self.mutate(apply)
 
     async def remove_proj_contributor(self, proj, contributor_id):
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
-        
-        # debug
-        print(projects)
-        print(contributor_id)
-        
-        if proj in projects and str(contributor_id) in projects[proj]['Contributors']:
-            projects[proj]['Contributors'].remove(str(contributor_id))
-        else:
-            return False  # Contributor does not exist
+        contributor_id = str(contributor_id)
 
-        new_content = self.format_message_content(projects)
-        await self.update_message(new_content)
-        return True
+        def apply(board):
+            project = board.get(proj)
+            if project is None or not project.remove_contributor(contributor_id):
+                return False  # Contributor does not exist
+            self.project_changed(proj)
+            return True
+
+        return await self.mutate(apply)
+
+    async def create_projects(self, names, admin_id):
+        """ Create several projects with a single board edit
+
+        :param names: Project names
+        :param admin_id: Discord user ID of the admin of every new project
+        :return: List of the names created, leaving out those that already exist
+        """
+        admin_id = str(admin_id)
+
+        def apply(board):
+            new = [Project(proj, admin=admin_id, contributors=[admin_id]) for proj in dict.fromkeys(names) if proj not in board]
+            # Every project is checked first, so that the command applies completely or not at all
+            for project in new:
+                board_format.check_block_length(project)
+            for project in new:
+                board.add(project)
+                self.project_changed(project.name)
+            return [project.name for project in new] or False
+
+        return await self.mutate(apply) or []
+
+    async def add_proj_contributors(self, proj, contributor_ids):
+        """ Add several contributors to a project with a single board edit
+
+        :param proj: Project name
+        :param contributor_ids: Discord user IDs
+        :return: List of the IDs added, or None if the project does not exist
+        """
+        contributor_ids = [str(contributor_id) for contributor_id in contributor_ids]
+
+        missing = False
+
+        def apply(board):
+            nonlocal missing
+            project = board.get(proj)
+            if project is None:
+                missing = True
+                return False
+            board_format.check_block_length(
+                Project(proj, project.description, project.admin, [*project.contributors, *contributor_ids]))
+            added = [contributor_id for contributor_id in contributor_ids if project.add_contributor(contributor_id)]
+            if added:
+                self.project_changed(proj)
+            return added or False
+
+        added = await self.mutate(apply)
+        return None if missing else added or []
+
+    async def remove_proj_contributors(self, proj, contributor_ids):
+        """ Remove several contributors from a project with a single board edit
+
+        :param proj: Project name
+        :param contributor_ids: Discord user IDs
+        :return: List of the IDs removed, or None if the project does not exist
+        """
+        contributor_ids = [str(contributor_id) for contributor_id in contributor_ids]
+
+        missing = False
+
+        def apply(board):
+            nonlocal missing
+            project = board.get(proj)
+            if project is None:
+                missing = True
+                return False
+            removed = [contributor_id for contributor_id in contributor_ids if project.remove_contributor(contributor_id)]
+            if removed:
+                self.project_changed(proj)
+            return removed or False
+
+        removed = await self.mutate(apply)
+        return None if missing else removed or []
+
+    def export_board(self, fmt='yaml'):
+        """ Export the board as YAML or JSON
+
+        :param fmt: 'yaml' or 'json'
+        :return: Exported text
+        """
+        return board_io.dump_board(self.board, fmt)
+
+    async def replace_board(self, board: Board):
+        """ Replace the whole board, e.g. with an imported one, in a single board edit
+
+        :param board: Validated board
+        :return: None
+        """
+        def apply(_):
+            self.board = board
+            self.lay_out_shards()
+            if self.store is not None:
+                self.store.import_board(board, self.shards)
+
+        await self.mutate(apply)
 
     async def get_proj_desc(self, proj):
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
-        return projects.get(proj, {}).get('Description', None)
+        project = self.board.get(proj)
+        return project.description if project is not None else None
+
+    async def get_proj_admin(self, proj):
+        """ User ID of a project's admin
+
+        :return: User ID, or None if the project is missing or has no admin
+        """
+        project = self.board.get(proj)
+        return int(project.admin) if project is not None and project.admin else None
+
+    async def get_user_projects(self, user_id):
+        """ Projects a user administers and contributes to, served from the board's reverse indexes
+
+        :param user_id: Discord user ID
+        :return: (list of administered project names, list of contributed project names)
+        """
+        user_id = str(user_id)
+        return self.board.projects_administered_by(user_id), self.board.projects_of(user_id)
+
+    async def get_proj_members(self, proj):
+        """ Admin and contributors of a project
+
+        :param proj: Project name
+        :return: (admin ID, list of contributor IDs), or None if the project does not exist
+        """
+        project = self.board.get(proj)
+        if project is None:
+            return None
+        return project.admin, list(project.contributors)
+
+    async def search_projects(self, query, limit=10):
+        """ Rank projects by how well their name and description match a query
+
+        :param query: Free text query
+        :param limit: Maximum number of results
+        :return: List of (project name, description), best match first
+        """
+        return [(name, self.board.get(name).description) for name, _ in self.board.search(query, limit)]
 
-    async def get_proj_admin(self, proj) -> int:
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
-        return int(projects.get(proj, {}).get('Admin', None))
-    
     async def project_exists(self, proj):
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
-        return proj in projects
+        return proj in self.board
 
-    async def remove_project(self, proj):
-        message = await self.get_message()
-        projects = self.parse_message_content(message.content)
+    def complete_proj_name(self, prefix, limit=25):
+        return self.board.complete(prefix, limit)
 
-        if proj in projects:
-            del projects[proj]
+    async def remove_project(self, proj):
+        def apply(board):
+            if board.remove(proj) is not None:
+                self.project_removed(proj)
 
-        new_content = self.format_message_content(projects)
-        await self.update_message(new_content)
+        await self.mutate(apply)
@@ -0,0 +1,247 @@
+import asyncio
+import itertools
+import random
+import time
+import discord
+
+# Request priorities, lower values are dispatched first
+INTERACTION = 0
+BOARD_WRITE = 1
+BOARD_READ = 2
+
+# Discord allows a bot 50 requests per second across all routes
+GLOBAL_RATE = 50
+# Message routes of a channel allow about 5 requests every 5 seconds
+BUCKET_RATE = 5
+BUCKET_PER = 5.0
+# Rate limited requests are retried this many times before the 429 is raised
+MAX_RETRIES = 5
+# Fraction of retry_after added at random to a backoff, so retries do not land together
+BACKOFF_JITTER = 0.2
+
+
+class Token_Bucket:
+    """ Request budget of one rate limit bucket
+
+    Tokens refill continuously at `rate` per `per` seconds. A 429 blocks the
+    bucket for its retry_after and empties it, so requests resume at the refill
+    rate instead of all at once.
+    """
+    __slots__ = ('rate', 'per', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate=None, per: float = 1.0):
+        """
+        :param rate: Requests allowed per `per` seconds, None for no budget
+        :param per: Budget window in seconds
+        """
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate or 0)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """ Seconds until the bucket can send a request, 0 if it can send one now """
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.rate is None:
+            return 0.0
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.per / self.rate
+
+    def take(self):
+        if self.rate is not None:
+            self.tokens -= 1
+
+    def block(self, now: float, retry_after: float):
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        self.tokens = 0.0
+        self.updated = self.blocked_until
+
+
+class Request:
+    __slots__ = ('priority', 'seq', 'bucket', 'factory', 'key', 'futures', 'attempts')
+
+    def __init__(self, priority: int, seq: int, bucket, factory, key):
+        self.priority = priority
+        self.seq = seq
+        self.bucket = bucket
+        self.factory = factory
+        self.key = key
+        self.futures = []
+        self.attempts = 0
+
+
+def rate_limit_retry_after(error: Exception):
+    """ Seconds a rate limited request asked to wait, or None if the error is not a 429 """
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    if isinstance(error, discord.HTTPException) and error.status == 429:
+        try:
+            return float(error.response.headers.get('Retry-After', 1.0))
+        except (AttributeError, TypeError, ValueError):
+            return 1.0
+    return None
+
+
+class Request_Scheduler:
+    """ Outbound scheduler for Discord REST calls
+
+    Requests wait in one queue and are dispatched by priority, then in
+    submission order, as soon as both the global budget and the budget of their
+    bucket allow. A request blocked on its bucket does not hold back requests
+    for other buckets, so interaction replies are never stuck behind board edits.
+
+    Requests sharing a supersede key, such as edits of the same message, are
+    sent one at a time. A newer one replaces the one still waiting, whose
+    callers are answered by the newer request instead.
+
+    A 429 blocks the request's bucket for its retry_after, with jitter, and the
+    request goes back to the queue in its original place. Nothing sleeps while
+    holding up other requests.
+    """
+    def __init__(self, bucket_rate=BUCKET_RATE, bucket_per: float = BUCKET_PER, global_rate=GLOBAL_RATE):
+        """
+        :param bucket_rate: Requests allowed per bucket every `bucket_per` seconds, None for no budget
+        :param bucket_per: Bucket budget window in seconds
+        :param global_rate: Requests allowed per second across all buckets, None for no budget
+        """
+        self.bucket_rate = bucket_rate
+        self.bucket_per = bucket_per
+        self.global_bucket = Token_Bucket(global_rate, 1.0)
+        self.buckets = {}
+        self.queue = []
+        self.waiting = {}
+        self.in_flight = set()
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.dispatcher = None
+        # Requests being sent, referenced until they finish so their tasks cannot be garbage collected
+        self.sending = set()
+
+    def get_bucket(self, name) -> Token_Bucket:
+        if name is None:
+            return self.global_bucket
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            bucket = self.buckets[name] = Token_Bucket(self.bucket_rate, self.bucket_per)
+        return bucket
+
+    def enqueue(self, priority: int, bucket, factory, supersede_key=None) -> asyncio.Future:
+        """ Queue a request without waiting for it
+
+        :param priority: INTERACTION, BOARD_WRITE or BOARD_READ
+        :param bucket: Name of the rate limit bucket, None for the global budget only
+        :param factory: Function returning the awaitable API call, called once per attempt
+        :param supersede_key: Key of requests that newer ones with the same key make redundant
+        :return: Future resolved with the result of the call
+        """
+        future = asyncio.get_running_loop().create_future()
+        request = self.waiting.get(supersede_key) if supersede_key is not None else None
+        if request is not None:
+            request.factory = factory
+            request.priority = min(request.priority, priority)
+        else:
+            request = Request(priority, next(self.counter), bucket, factory, supersede_key)
+            self.queue.append(request)
+            if supersede_key is not None:
+                self.waiting[supersede_key] = request
+        request.futures.append(future)
+
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self.dispatch())
+        self.wakeup.set()
+        return future
+
+    async def submit(self, priority: int, bucket, factory, supersede_key=None):
+        """ Queue a request and wait for its result, see enqueue() """
+        return await self.enqueue(priority, bucket, factory, supersede_key)
+
+    async def dispatch(self):
+        while True:
+            self.wakeup.clear()
+            wait = self.dispatch_ready()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def dispatch_ready(self):
+        """ Start every queued request the budgets allow
+
+        :return: Seconds until the next queued request may be sent, None if nothing is waiting on a budget
+        """
+        now = time.monotonic()
+        next_wait = None
+        remaining = []
+        for request in sorted(self.queue, key=lambda r: (r.priority, r.seq)):
+            if request.key is not None and request.key in self.in_flight:
+                remaining.append(request)
+                continue
+            bucket = self.get_bucket(request.bucket)
+            wait = max(self.global_bucket.wait_time(now), bucket.wait_time(now))
+            if wait > 0:
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                remaining.append(request)
+                continue
+            self.global_bucket.take()
+            if bucket is not self.global_bucket:
+                bucket.take()
+            if request.key is not None:
+                self.in_flight.add(request.key)
+                del self.waiting[request.key]
+            sending = asyncio.create_task(self.send(request))
+            self.sending.add(sending)
+            sending.add_done_callback(self.sending.discard)
+        self.queue = remaining
+        return next_wait
+
+    async def send(self, request: Request):
+        try:
+            result = await request.factory()
+        except Exception as e:
+            retry_after = rate_limit_retry_after(e)
+            if retry_after is not None and request.attempts < MAX_RETRIES:
+                request.attempts += 1
+                backoff = retry_after * (1 + random.uniform(0, BACKOFF_JITTER))
+                self.get_bucket(request.bucket).block(time.monotonic(), backoff)
+                self.requeue(request)
+            else:
+                for future in request.futures:
+                    if not future.done():
+                        future.set_exception(e)
+        else:
+            for future in request.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.in_flight.discard(request.key)
+            self.wakeup.set()
+
+    def requeue(self, request: Request):
+        newer = self.waiting.get(request.key) if request.key is not None else None
+        if newer is not None:
+            # A newer request with the same key was queued meanwhile and answers both
+            newer.futures.extend(request.futures)
+            newer.seq = min(newer.seq, request.seq)
+            newer.priority = min(newer.priority, request.priority)
+            return
+        self.queue.append(request)
+        if request.key is not None:
+            self.waiting[request.key] = request
+
+    async def close(self):
+        """ Stop the dispatcher, leaving queued requests unsent
+
+        :return: None
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            try:
+                await self.dispatcher
+            except asyncio.CancelledError:
+                pass
+            self.dispatcher = None
@@ -0,0 +1,108 @@
+import bisect
+import math
+import re
+from collections import Counter
+
+# Words of a project name count this many times more than words of its description
+NAME_WEIGHT = 3
+# BM25 parameters: term frequency saturation and document length normalisation
+K1 = 1.2
+B = 0.75
+# Query words at least this long also match longer words starting with them, at a discount
+MIN_PREFIX_LENGTH = 3
+PREFIX_DISCOUNT = 0.5
+
+WORD = re.compile(r'[^\W_]+')
+
+
+def tokenize(text: str):
+    return WORD.findall(text.lower())
+
+
+class Search_Index:
+    """ Incrementally maintained inverted index over project names and descriptions
+
+    Each project is a document whose terms are the words of its name, weighted
+    by NAME_WEIGHT, and of its description. Adding or removing a project only
+    touches the postings of its own terms, so a change never reindexes the
+    board. Results are ranked with BM25.
+    """
+    __slots__ = ('postings', 'documents', 'lengths', 'total_length', 'vocabulary')
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.lengths = {}
+        self.total_length = 0
+        # Sorted terms, for prefix matches
+        self.vocabulary = []
+
+    def add(self, name: str, description: str = ''):
+        """ Index a project, replacing its previous entry
+
+        :param name: Project name
+        :param description: Project description
+        :return: None
+        """
+        self.remove(name)
+        terms = Counter()
+        for term in tokenize(name):
+            terms[term] += NAME_WEIGHT
+        terms.update(tokenize(description))
+        self.documents[name] = terms
+        length = sum(terms.values())
+        self.lengths[name] = length
+        self.total_length += length
+        for term, count in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                bisect.insort(self.vocabulary, term)
+            posting[name] = count
+
+    def remove(self, name: str):
+        terms = self.documents.pop(name, None)
+        if terms is None:
+            return
+        self.total_length -= self.lengths.pop(name)
+        for term in terms:
+            posting = self.postings[term]
+            del posting[name]
+            if not posting:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def matching_terms(self, word: str):
+        """ Indexed terms a query word matches, with their weight
+
+        :return: List of (term, weight), the word itself at full weight and longer terms it prefixes at a discount
+        """
+        matches = [(word, 1.0)] if word in self.postings else []
+        if len(word) >= MIN_PREFIX_LENGTH:
+            i = bisect.bisect_right(self.vocabulary, word)
+            while i < len(self.vocabulary) and self.vocabulary[i].startswith(word):
+                matches.append((self.vocabulary[i], PREFIX_DISCOUNT))
+                i += 1
+        return matches
+
+    def search(self, query: str, limit: int = 10):
+        """ Rank projects against a free text query
+
+        :param query: Words to look for, matched case-insensitively
+        :param limit: Maximum number of results
+        :return: List of (project name, score), best first
+        """
+        count = len(self.documents)
+        if not count:
+            return []
+        average_length = self.total_length / count
+        scores = {}
+        for word in set(tokenize(query)):
+            for term, weight in self.matching_terms(word):
+                posting = self.postings[term]
+                idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for name, frequency in posting.items():
+                    norm = K1 * (1 - B + B * self.lengths[name] / average_length)
+                    score = weight * idf * frequency * (K1 + 1) / (frequency + norm)
+                    scores[name] = scores.get(name, 0.0) + score
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
@@ -0,0 +1,27 @@
+import time
+
+
+class Startup_Timer:
+    """ Records named checkpoints during startup and reports the time spent between them """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = []
+
+    def mark(self, label: str):
+        self.marks.append((label, time.perf_counter()))
+
+    def report(self) -> str:
+        """ Format the startup breakdown
+
+        :return: One line per checkpoint with the stage time and the time since start
+        """
+        lines = ['Startup time breakdown:']
+        previous = self.start
+        for label, at in self.marks:
+            lines.append(f'  {label:<28} {(at - previous) * 1000:8.1f} ms  (total {(at - self.start) * 1000:8.1f} ms)')
+            previous = at
+        return '\n'.join(lines)
+
+
+# Created on first import, which the launcher does before any other import
+startup_timer = Startup_Timer()
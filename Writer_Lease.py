@@ -0,0 +1,108 @@
+import os
+import socket
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+# Seconds a lease lasts unless renewed
+LEASE_DURATION = 15.0
+# A holder stops writing this many seconds before its lease expires, so that a
+# write already on its way has landed by the time another process can take over
+SAFETY_MARGIN = 3.0
+# Seconds acquire() waits for other processes' transactions, which only take
+# microseconds. It runs on the event loop, so it must never wait for long.
+BUSY_TIMEOUT = 0.1
+
+
+class Writer_Lease:
+    """ Time-limited lease, kept in a local SQLite database, electing the single writer of a resource
+
+    Processes on one machine share the database file. acquire() takes the lease
+    if it is free, expired or already held, and renews it in that case, so the
+    holder keeps it by calling acquire() well within `duration` seconds. A holder
+    that stops renewing, e.g. because its process died, loses the lease once it
+    expires, and the next process calling acquire() takes over.
+
+    Whether the lease is still held is checked against the expiry recorded on
+    the last renewal, so held() needs no database access and can guard every write.
+    """
+    def __init__(self, path: str, name: str, duration: float = LEASE_DURATION, holder: str = None):
+        """
+        :param path: Path of the SQLite database shared by the processes
+        :param name: Name of the resource, e.g. the board the lease elects the writer of
+        :param duration: Seconds the lease lasts unless renewed
+        :param holder: Name of this holder, the host and process ID by default
+        """
+        self.path = path
+        self.name = name
+        self.duration = duration
+        self.holder = holder if holder is not None else f'{socket.gethostname()}:{os.getpid()}'
+        self.expires = 0.0
+        # Transactions are opened explicitly, see acquire
+        self.connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def acquire(self) -> bool:
+        """ Take or renew the lease
+
+        If the database stays locked by other processes for BUSY_TIMEOUT, the
+        lease is neither taken nor renewed, and a lease already held is kept
+        until it expires.
+
+        :return: True if this holder now holds the lease
+        """
+        now = time.time()
+        # An immediate transaction locks out other writers between the read and the write
+        try:
+            self.connection.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            return self.held()
+        try:
+            row = self.connection.execute('SELECT holder, expires FROM leases WHERE name = ?', (self.name,)).fetchone()
+            if row is None or row[0] == self.holder or row[1] <= now:
+                expires = now + self.duration
+                self.connection.execute('INSERT OR REPLACE INTO leases (name, holder, expires) VALUES (?, ?, ?)',
+                                        (self.name, self.holder, expires))
+                self.expires = expires
+            else:
+                self.expires = 0.0
+            self.connection.execute('COMMIT')
+        except sqlite3.Error:
+            self.connection.execute('ROLLBACK')
+            self.expires = 0.0
+            raise
+        return self.expires > 0.0
+
+    def held(self) -> bool:
+        """ Whether this holder may still write, without touching the database
+
+        :return: True until SAFETY_MARGIN seconds before the lease expires
+        """
+        return time.time() < self.expires - min(SAFETY_MARGIN, self.duration / 3)
+
+    def current_holder(self):
+        """ Name of the process holding the lease
+
+        :return: Holder name, or None if the lease is free or expired
+        """
+        row = self.connection.execute('SELECT holder, expires FROM leases WHERE name = ?', (self.name,)).fetchone()
+        return row[0] if row is not None and row[1] > time.time() else None
+
+    def release(self):
+        """ Give up the lease, letting another process take over without waiting for it to expire
+
+        :return: None
+        """
+        self.expires = 0.0
+        with self.connection:
+            self.connection.execute('DELETE FROM leases WHERE name = ? AND holder = ?', (self.name, self.holder))
@@ -0,0 +1,219 @@
+import asyncio
+import itertools
+import time
+from types import SimpleNamespace
+import discord
+
+# Discord snowflakes grow with time, so message IDs here grow with every send
+_snowflakes = itertools.count(1_300_000_000_000_000_000)
+# Discord answers content longer than this with a 400
+MESSAGE_LIMIT = 2000
+
+
+def check_content(content):
+    if content is not None and len(content) > MESSAGE_LIMIT:
+        raise discord.HTTPException(SimpleNamespace(status=400, reason='Bad Request'),
+                                    'Must be 2000 or fewer in length.')
+
+
+class Fake_API:
+    """ Records every simulated REST call and injects latency and 429 responses
+
+    :param latency: Seconds each call takes
+    :param rate_limit_every: Every Nth call is answered with a 429 first, 0 to disable
+    :param retry_after: Seconds the 429 asks the caller to wait
+    :param raise_rate_limits: Raise discord.RateLimited instead of waiting, like a
+                              client with max_ratelimit_timeout set
+    """
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0, retry_after: float = 0.05,
+                 raise_rate_limits: bool = False):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.raise_rate_limits = raise_rate_limits
+        self.calls = []
+        self.rate_limits = 0
+        self.rate_limit_wait = 0.0
+
+    async def request(self, route: str):
+        self.calls.append(route)
+        if self.rate_limit_every and len(self.calls) % self.rate_limit_every == 0:
+            self.rate_limits += 1
+            if self.raise_rate_limits:
+                raise discord.RateLimited(self.retry_after)
+            started = time.perf_counter()
+            await asyncio.sleep(self.retry_after)
+            self.rate_limit_wait += time.perf_counter() - started
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def count(self, prefix: str = '') -> int:
+        return sum(1 for route in self.calls if route.startswith(prefix))
+
+    def reset(self):
+        self.calls.clear()
+        self.rate_limits = 0
+        self.rate_limit_wait = 0.0
+
+
+class Fake_User:
+    def __init__(self, user_id: int, name: str = 'user'):
+        self.id = user_id
+        self.name = name
+        self.mention = f'<@{user_id}>'
+
+    def __str__(self):
+        return self.name
+
+
+class Fake_Message:
+    def __init__(self, channel, message_id: int, content: str = '', author=None):
+        self.channel = channel
+        self.id = message_id
+        self.content = content
+        self.author = author
+
+    async def edit(self, content=None, **kwargs):
+        await self.channel.api.request('PATCH /messages')
+        check_content(content)
+        stored = self.channel.messages.get(self.id)
+        if stored is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason='Not Found'), 'Unknown Message')
+        stored.content = content
+        return stored
+
+    async def delete(self):
+        await self.channel.api.request('DELETE /messages')
+        if self.channel.messages.pop(self.id, None) is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason='Not Found'), 'Unknown Message')
+
+
+class Fake_Channel:
+    def __init__(self, api: Fake_API, channel_id: int, guild):
+        self.api = api
+        self.id = channel_id
+        self.guild = guild
+        self.messages = {}
+
+    def permissions_for(self, member):
+        return discord.Permissions.all()
+
+    async def send(self, content: str = '', **kwargs):
+        await self.api.request('POST /messages')
+        check_content(content)
+        message = Fake_Message(self, next(_snowflakes), content, self.guild.me)
+        self.messages[message.id] = message
+        return message
+
+    async def fetch_message(self, message_id: int):
+        await self.api.request('GET /messages')
+        if message_id not in self.messages:
+            raise discord.NotFound(SimpleNamespace(status=404, reason='Not Found'), 'Unknown Message')
+        return self.messages[message_id]
+
+    def get_partial_message(self, message_id: int):
+        return Fake_Message(self, message_id)
+
+    async def history(self, limit=100, after=None, oldest_first=None, **kwargs):
+        after_id = after.id if after is not None else 0
+        ids = sorted(message_id for message_id in self.messages if message_id > after_id)
+        if limit is not None:
+            ids = ids[:limit]
+        # Discord pages history 100 messages per request
+        for page in range(0, max(len(ids), 1), 100):
+            await self.api.request('GET /messages?history')
+            for message_id in ids[page:page + 100]:
+                yield self.messages[message_id]
+
+
+class Fake_Client:
+    """ Stand-in for discord.Client with enough surface for Projects_Info and a CommandTree """
+    def __init__(self, api: Fake_API = None, user_id: int = 1):
+        self.api = api if api is not None else Fake_API()
+        self.user = Fake_User(user_id, 'uslsbot')
+        self.application_id = user_id
+        self.http = None
+        self._connection = SimpleNamespace(_command_tree=None)
+        self.channels = {}
+
+    def add_channel(self, channel_id: int, guild_id: int = 1):
+        guild = SimpleNamespace(id=guild_id, me=self.user)
+        self.channels[channel_id] = Fake_Channel(self.api, channel_id, guild)
+        return self.channels[channel_id]
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+
+class Fake_Response:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def send_message(self, content=None, **kwargs):
+        if self.done:
+            raise discord.InteractionResponded(self.interaction)
+        await self.interaction.api.request('POST /interactions/callback')
+        self.done = True
+        self.interaction.responded_at = time.perf_counter()
+        self.interaction.replies.append(content)
+        return SimpleNamespace(resource=Fake_Interaction_Message(self.interaction))
+
+    async def edit_message(self, content=None, **kwargs):
+        if self.done:
+            raise discord.InteractionResponded(self.interaction)
+        await self.interaction.api.request('POST /interactions/callback')
+        self.done = True
+        self.interaction.responded_at = time.perf_counter()
+        self.interaction.replies.append(kwargs.get('embed', content))
+
+    async def defer(self, **kwargs):
+        if self.done:
+            raise discord.InteractionResponded(self.interaction)
+        await self.interaction.api.request('POST /interactions/callback')
+        self.done = True
+        self.interaction.responded_at = time.perf_counter()
+
+
+class Fake_Followup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, wait=False, **kwargs):
+        await self.interaction.api.request('POST /webhooks')
+        self.interaction.replies.append(content)
+        return Fake_Interaction_Message(self.interaction) if wait else None
+
+
+class Fake_Interaction_Message:
+    """ Message an interaction was answered with, directly or as a follow-up """
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def edit(self, **kwargs):
+        await self.interaction.api.request('PATCH /webhooks/messages')
+
+
+class Fake_Interaction:
+    """ Interaction handed to command callbacks
+
+    Replies, including follow-ups, are collected in `replies`, and `responded_at`
+    records when the interaction was first answered or deferred.
+    """
+    def __init__(self, client: Fake_Client, user: Fake_User, guild_id: int = 1, channel_id: int = None):
+        self.client = client
+        self.api = client.api
+        self.user = user
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.message = None
+        self.replies = []
+        self.responded_at = None
+        self.response = Fake_Response(self)
+        self.followup = Fake_Followup(self)
+
+    async def delete_original_response(self):
+        await self.api.request('DELETE /webhooks/messages/@original')
@@ -0,0 +1,153 @@
+""" Property checks for the board message parser over generated and damaged boards
+
+Run from the repository root:
+
+    python -m benchmarks.parser_fuzz --cases 2000
+
+Every case generates a random board and checks that:
+
+- parsing the formatted board gives the same board and the current schema version,
+- the same content without its version marker parses as version 0,
+- damaged content, as left by hand edits or older layouts, parses without raising,
+- parsing is idempotent: formatting a parsed board and parsing it again changes nothing.
+"""
+import argparse
+import random
+import time
+import board_format
+from Board import Board, Project
+from Projects_Info import Projects_Info, HEADER, CONTINUATION_HEADER
+
+NAME_CHARACTERS = 'abcdefghijklmnopqrstuvwxyz ABCXYZ0123456789-_#:<@>!*é漢🙂'
+JUNK_LINES = (
+    '',
+    '##',
+    '## ',
+    '#',
+    'Description: stray',
+    '  Project Admin: <@>',
+    '  Project Admin: <@&42>',
+    '    👉 <#123>',
+    '    👉 <@!77>',
+    '    👉 @someone',
+    'Project contributors:',
+    'random text <@5>',
+    '\u200b\u2063',
+)
+# Failures kept in the report, with the content that caused them
+MAX_REPORTED_FAILURES = 5
+
+
+def random_text(rng: random.Random, max_length: int) -> str:
+    return ''.join(rng.choice(NAME_CHARACTERS) for _ in range(rng.randint(0, max_length))).strip()
+
+
+def random_user_id(rng: random.Random) -> str:
+    return str(rng.randint(10 ** 16, 10 ** 19))
+
+
+def random_board(rng: random.Random) -> Board:
+    board = Board()
+    for i in range(rng.randint(0, 12)):
+        # The index keeps names unique and never blank
+        name = f'{random_text(rng, 20)} {i}'.strip()
+        admin = random_user_id(rng) if rng.random() < 0.9 else ''
+        contributors = [random_user_id(rng) for _ in range(rng.randint(0, 5))]
+        board.add(Project(name, random_text(rng, 60), admin, contributors))
+    return board
+
+
+def damage(rng: random.Random, content: str) -> str:
+    """ Apply one random kind of damage to formatted board content """
+    lines = content.split('\n')
+    kind = rng.randrange(9)
+    if kind == 0:
+        return content[:rng.randint(0, len(content))]
+    if kind == 1:
+        lines.insert(rng.randint(0, len(lines)), rng.choice(JUNK_LINES))
+    elif kind == 2:
+        lines = [rng.choice(JUNK_LINES) for _ in range(rng.randint(1, 4))] + lines
+    elif kind == 3:
+        return content.replace('<@', '<@!')
+    elif kind == 4:
+        lines = [line.split('<@', 1)[0] if 'Project Admin:' in line else line for line in lines]
+    elif kind == 5:
+        del lines[rng.randrange(len(lines))]
+    elif kind == 6:
+        i, j = rng.randrange(len(lines)), rng.randrange(len(lines))
+        lines[i], lines[j] = lines[j], lines[i]
+    elif kind == 7:
+        return '\r\n'.join(lines)
+    else:
+        return content.replace(board_format.SCHEMA_MARKER, '')
+    return '\n'.join(lines)
+
+
+def check_case(rng: random.Random, proj_info: Projects_Info):
+    """ Run the checks for one random board
+
+    :return: None if every check passed, otherwise a description of the failure
+    """
+    board = random_board(rng)
+    header = rng.choice((HEADER, CONTINUATION_HEADER))
+    content = proj_info.format_message_content(board, header)
+
+    parsed, version = board_format.parse_board(content)
+    if Board(parsed) != board or version != board_format.SCHEMA_VERSION:
+        return f'round trip changed the board (version {version})', content
+    old, version = board_format.parse_board(content.replace(board_format.SCHEMA_MARKER, ''))
+    if Board(old) != board or version != 0:
+        return f'unmarked content parsed as version {version}', content
+
+    damaged = damage(rng, content)
+    try:
+        parsed, _ = board_format.parse_board(damaged)
+        again, _ = board_format.parse_board(proj_info.format_message_content(parsed, header))
+    except Exception as e:
+        return f'{type(e).__name__}: {e}', damaged
+    if Board(again) != Board(parsed):
+        return 'parsing is not idempotent', damaged
+    return None
+
+
+def run_fuzz(cases: int, seed: int = 0) -> dict:
+    """ Check `cases` random boards
+
+    :return: Dict with the number of cases and failures, the cases checked per second and the first failures
+    """
+    rng = random.Random(seed)
+    proj_info = Projects_Info(None, 0, 0)
+    failures = []
+    failure_count = 0
+    started = time.perf_counter()
+    for _ in range(cases):
+        failure = check_case(rng, proj_info)
+        if failure is not None:
+            failure_count += 1
+            if len(failures) < MAX_REPORTED_FAILURES:
+                failures.append({'reason': failure[0], 'content': failure[1]})
+    elapsed = time.perf_counter() - started
+    return {
+        'cases': cases,
+        'seed': seed,
+        'failures': failure_count,
+        'cases_per_s': cases / elapsed if elapsed else 0.0,
+        'first_failures': failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Property checks for the board message parser')
+    parser.add_argument('--cases', type=int, default=2000, help='Random boards to check')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random boards')
+    args = parser.parse_args()
+
+    result = run_fuzz(args.cases, args.seed)
+    for failure in result['first_failures']:
+        print(f"{failure['reason']}:\n{failure['content']!r}\n")
+    print(f"{result['cases']} cases, {result['failures']} failures, {result['cases_per_s']:.0f} cases/s")
+    raise SystemExit(1 if result['failures'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+""" Offline benchmarks for Projects_Info and the bot commands
+
+Run from the repository root:
+
+    python -m benchmarks.run_benchmarks --output bench_results.json
+
+Commands are driven through the callbacks registered by bot_commands.add_commands
+against the fake client in benchmarks.fake_discord, which counts REST calls and
+can inject latency and 429 responses.
+
+The memory of a board of MEMORY_BOARD_SIZE projects is reported as a whole and
+part by part. Its project records, without their cached blocks and the Board's
+indexes, must take less memory than the nested dicts they replaced. The whole
+model takes several times more. A board shrinking to a
+fifth of SHRINK_BOARD_SIZE projects must take at most twice the shard messages of
+a fresh layout, or the run exits with status 1.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from discord import app_commands
+import board_format
+import bot_commands
+from Board import Board, Project
+from Board_Registry import Board_Registry
+from Metrics import metrics
+from Project_Browser import Page_Cache
+from Projects_Info import Projects_Info
+from Request_Scheduler import Request_Scheduler
+from benchmarks.parser_fuzz import run_fuzz
+from benchmarks.fake_discord import Fake_API, Fake_Client, Fake_Interaction, Fake_User
+
+CHANNEL_ID = 10
+OWNER_ID = 1000
+BOARD_SIZES = (10, 100, 1000, 5000)
+# Projects on the board whose memory is measured
+MEMORY_BOARD_SIZE = 5000
+# Projects on the board that loses four projects in five
+SHRINK_BOARD_SIZE = 200
+
+
+def make_board(size: int) -> Board:
+    return Board(
+        Project(f'project {i}', f'Description of project {i}', str(OWNER_ID + i), [str(OWNER_ID + i), str(2000 + i)])
+        for i in range(size)
+    )
+
+
+def make_api(args) -> Fake_API:
+    return Fake_API(args.latency, args.rate_limit_every, args.retry_after, args.raise_rate_limits)
+
+
+async def make_projects_info(api: Fake_API, size: int, edit_delay: float, bucket_rate=None):
+    """ Set up a fake channel holding a board of `size` projects, loaded into a Projects_Info
+
+    :param bucket_rate: Request budget per 5 seconds of the channel, None for no budget
+
+    :return: (Fake_Client, Projects_Info)
+    """
+    client = Fake_Client(api)
+    channel = client.add_channel(CHANNEL_ID)
+    head = await channel.send('# **Projects Info**')
+    proj_info = Projects_Info(client, CHANNEL_ID, head.id, edit_delay, scheduler=Request_Scheduler(bucket_rate))
+    await proj_info.load()
+
+    board = make_board(size)
+
+    def apply(_):
+        for project in board:
+            proj_info.board.add(project)
+            proj_info.project_changed(project.name)
+
+    await proj_info.mutate(apply)
+    api.reset()
+    boards = Board_Registry(proj_info.scheduler)
+    boards.add(channel.guild.id, proj_info)
+    return client, proj_info, boards
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': samples[len(samples) // 2] * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+
+def command_cases(iterations: int):
+    """ Argument lists for each command, one per iteration, that exercise the success path
+
+    :return: Dict of command name to list of keyword arguments
+    """
+    member = Fake_User(5000, 'member')
+    admin = Fake_User(5001, 'admin')
+    # A cohort of 30 members added or kicked with one bulk command
+    cohort = ' '.join(f'<@{6000 + i}>' for i in range(30))
+    return {
+        'see_projects': [{} for _ in range(iterations)],
+        'get_proj_desc': [{'proj': f'project {i}'} for i in range(iterations)],
+        'my_projects': [{'member': Fake_User(OWNER_ID + i)} for i in range(iterations)],
+        'project_members': [{'pname': f'project {i}'} for i in range(iterations)],
+        'search_projects': [{'query': f'description of project {i}'} for i in range(iterations)],
+        'set_proj_desc': [{'proj': f'project {i}', 'new_desc': f'New description {i}'} for i in range(iterations)],
+        'create_project': [{'pname': f'new project {i}', 'padmin': admin} for i in range(iterations)],
+        'project_add_member': [{'pname': f'project {i}', 'new_member': member} for i in range(iterations)],
+        'project_kick_member': [{'pname': f'project {i}', 'member_name': member} for i in range(iterations)],
+        'project_add_members': [{'pname': f'project {i}', 'members': cohort} for i in range(iterations)],
+        'project_kick_members': [{'pname': f'project {i}', 'members': cohort} for i in range(iterations)],
+        'change_proj_admin': [{'proj': f'project {i}', 'new_admin': admin} for i in range(iterations)],
+        'set_proj_name': [{'proj': f'new project {i}', 'new_name': f'renamed project {i}'} for i in range(iterations)],
+        'remove_project': [{'pname': f'renamed project {i}'} for i in range(iterations)],
+    }
+
+
+async def bench_commands(args) -> dict:
+    """ Per-command latency and REST calls, running each command sequentially """
+    api = make_api(args)
+    client, proj_info, boards = await make_projects_info(api, args.board_size, args.edit_delay, args.bucket_rate)
+    tree = app_commands.CommandTree(client)
+    bot_commands.add_commands(tree, boards, OWNER_ID, args.response_budget)
+    owner = Fake_User(OWNER_ID, 'owner')
+
+    results = {}
+    for name, cases in command_cases(args.iterations).items():
+        callback = tree.get_command(name).callback
+        api.reset()
+        samples = []
+        first_response = []
+        for kwargs in cases:
+            interaction = Fake_Interaction(client, owner, channel_id=CHANNEL_ID)
+            started = time.perf_counter()
+            await callback(interaction, **kwargs)
+            samples.append(time.perf_counter() - started)
+            first_response.append(interaction.responded_at - started)
+        results[name] = {
+            'latency': summarize(samples),
+            'first_response': summarize(first_response),
+            'api_calls_per_command': len(api.calls) / len(cases),
+            'board_writes_per_command': (api.count('PATCH') + api.count('POST /messages') + api.count('DELETE')) / len(cases),
+            'rate_limits': api.rate_limits,
+            'rate_limit_wait_ms': api.rate_limit_wait * 1000,
+        }
+    await proj_info.close()
+    return results
+
+
+async def bench_burst(args) -> dict:
+    """ Many concurrent add-member commands, to measure coalescing of board edits """
+    api = make_api(args)
+    client, proj_info, boards = await make_projects_info(api, args.board_size, args.edit_delay, args.bucket_rate)
+    tree = app_commands.CommandTree(client)
+    bot_commands.add_commands(tree, boards, OWNER_ID, args.response_budget)
+    callback = tree.get_command('project_add_member').callback
+    owner = Fake_User(OWNER_ID, 'owner')
+
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        callback(Fake_Interaction(client, owner, channel_id=CHANNEL_ID), pname='project 0', new_member=Fake_User(9000 + i))
+        for i in range(args.burst)
+    ])
+    elapsed = time.perf_counter() - started
+    await proj_info.close()
+    return {
+        'commands': args.burst,
+        'elapsed_ms': elapsed * 1000,
+        'api_calls': len(api.calls),
+        'board_writes': api.count('PATCH') + api.count('POST /messages'),
+        'rate_limits': api.rate_limits,
+    }
+
+
+def bench_throughput(repeat: int) -> dict:
+    """ Parse and format throughput, and browser page rendering, for boards of increasing size """
+    proj_info = Projects_Info(None, CHANNEL_ID, 0)
+    results = {}
+    for size in BOARD_SIZES:
+        content = proj_info.format_message_content(make_board(size))
+
+        def timed(function):
+            best = float('inf')
+            for _ in range(repeat):
+                started = time.perf_counter()
+                function()
+                best = min(best, time.perf_counter() - started)
+            return best
+
+        parse = timed(lambda: board_format.parse_board(content))
+        parse_indexed = timed(lambda: proj_info.parse_message_content(content))
+        cold = timed(lambda: proj_info.format_message_content(make_board(size)))
+        build = timed(lambda: make_board(size))
+        board = make_board(size)
+        warm = timed(lambda: proj_info.format_message_content(board))
+        last_page = Page_Cache.page_count(board) - 1
+        page_cold = timed(lambda: Page_Cache().get(board, last_page))
+        page_cache = Page_Cache()
+        page_cache.get(board, last_page)
+        page_warm = timed(lambda: page_cache.get(board, last_page))
+        results[str(size)] = {
+            'content_chars': len(content),
+            'parse_ms': parse * 1000,
+            'parse_projects_per_s': size / parse,
+            'parse_into_board_ms': parse_indexed * 1000,
+            'format_cold_ms': max(cold - build, 0.0) * 1000,
+            'format_warm_ms': warm * 1000,
+            'format_warm_projects_per_s': size / warm,
+            'last_page_cold_ms': page_cold * 1000,
+            'last_page_cached_ms': page_warm * 1000,
+        }
+    return results
+
+
+def deep_size(root, skip=(), seen=None) -> int:
+    """ Bytes taken by an object and everything it references, counting shared objects once
+
+    :param root: Object to measure
+    :param skip: Types not followed, e.g. the Board each project points back to
+    :param seen: IDs of objects already counted, which are skipped and added to
+    :return: Size in bytes
+    """
+    seen = set() if seen is None else seen
+    pending = [root]
+    size = 0
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, (type, *skip)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        pending.extend(gc.get_referents(obj))
+    return size
+
+
+async def bench_memory(size: int) -> dict:
+    """ Memory of the whole board model after a flush, part by part, against the nested dicts it replaced
+
+    Each part counts only what the parts before it do not already hold, so the
+    parts add up to the whole model. The nested dicts had no counterpart of
+    the cached blocks or of the Board's indexes, so the gate in main() only
+    compares the project records with them.
+    """
+    _, proj_info, _ = await make_projects_info(Fake_API(), size, 0.0)
+    board = proj_info.board
+    nested = {
+        project.name: {'Description': project.description, 'Admin': project.admin,
+                       'Contributors': list(project.contributors)}
+        for project in board
+    }
+    seen = set()
+    blocks = [project.render() for project in board]
+    parts = {
+        'cached_blocks': deep_size(blocks, seen=seen) - sys.getsizeof(blocks),
+        'project_records': deep_size({project.name: project for project in board}, (Board,), seen),
+        'prefix_index': deep_size(board._prefix_index, seen=seen),
+        'search_index': deep_size(board._search_index, seen=seen),
+        'member_admin_indexes': deep_size((board._member_index, board._admin_index), seen=seen),
+    }
+    whole = deep_size(board)
+    await proj_info.close()
+    return {
+        'projects': size,
+        'nested_dicts_kib': deep_size(nested) / 1024,
+        'whole_model_kib': whole / 1024,
+        **{f'{part}_kib': part_size / 1024 for part, part_size in parts.items()},
+    }
+
+
+async def bench_shrink(size: int) -> dict:
+    """ Shard messages left after removing four projects in five one by one, against a fresh layout """
+    api = Fake_API()
+    client, proj_info, _ = await make_projects_info(api, size, 0.0)
+    before = len(proj_info.shards)
+    for i in range(size):
+        if i % 5:
+            await proj_info.remove_project(f'project {i}')
+    messages = len(client.get_channel(CHANNEL_ID).messages)
+    proj_info.lay_out_shards()
+    fresh = sum(1 for shard in proj_info.shards if shard.projects)
+    await proj_info.close()
+    return {
+        'projects': size,
+        'shards_before': before,
+        'messages_after': messages,
+        'fresh_layout_shards': fresh,
+        'board_writes': api.count('PATCH') + api.count('POST /messages') + api.count('DELETE'),
+    }
+
+
+async def run(args) -> dict:
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'latency_s': args.latency,
+            'edit_delay_s': args.edit_delay,
+            'rate_limit_every': args.rate_limit_every,
+            'raise_rate_limits': args.raise_rate_limits,
+            'bucket_rate': args.bucket_rate,
+            'response_budget_s': args.response_budget,
+            'board_size': args.board_size,
+            'iterations': args.iterations,
+            'metrics': args.metrics,
+            'fuzz_cases': args.fuzz_cases,
+        },
+        'commands': await bench_commands(args),
+        'burst': await bench_burst(args),
+        'throughput': bench_throughput(args.repeat),
+        'memory': await bench_memory(MEMORY_BOARD_SIZE),
+        'shrink': await bench_shrink(SHRINK_BOARD_SIZE),
+        'parser_fuzz': run_fuzz(args.fuzz_cases),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks against a fake Discord channel')
+    parser.add_argument('--output', default='bench_results.json', help='JSON file to write the results to')
+    parser.add_argument('--board-size', type=int, default=100, help='Projects on the board for command benchmarks')
+    parser.add_argument('--iterations', type=int, default=20, help='Invocations per command')
+    parser.add_argument('--burst', type=int, default=30, help='Concurrent commands in the burst benchmark')
+    parser.add_argument('--latency', type=float, default=0.02, help='Simulated seconds per REST call')
+    parser.add_argument('--edit-delay', type=float, default=0.05, help='Board edit coalescing window in seconds')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='Answer every Nth REST call with a 429')
+    parser.add_argument('--retry-after', type=float, default=0.05, help='Seconds a simulated 429 asks to wait')
+    parser.add_argument('--raise-rate-limits', action='store_true',
+                        help='Raise simulated 429s to the request scheduler instead of waiting them out')
+    parser.add_argument('--bucket-rate', type=int, default=None,
+                        help='Requests the scheduler allows per channel every 5 seconds, unlimited by default')
+    parser.add_argument('--response-budget', type=float, default=bot_commands.RESPONSE_BUDGET,
+                        help='Seconds a command may take before it defers')
+    parser.add_argument('--metrics', action='store_true', help='Enable instrumentation, to measure its overhead')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per throughput measurement, best is kept')
+    parser.add_argument('--fuzz-cases', type=int, default=500, help='Random boards checked against the parser')
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+
+    results = asyncio.run(run(args))
+    if args.metrics:
+        results['metrics'] = metrics.summary()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    for name, result in results['commands'].items():
+        latency = result['latency']
+        print(f"{name:<22} p50 {latency['p50_ms']:8.1f} ms  p95 {latency['p95_ms']:8.1f} ms  "
+              f"first response p95 {result['first_response']['p95_ms']:8.1f} ms  "
+              f"{result['api_calls_per_command']:5.2f} calls/cmd")
+    burst = results['burst']
+    print(f"burst of {burst['commands']} add_member: {burst['elapsed_ms']:.1f} ms, {burst['board_writes']} board writes")
+    for size, result in results['throughput'].items():
+        print(f"{size:>5} projects: parse {result['parse_ms']:8.2f} ms, into a board {result['parse_into_board_ms']:8.2f} ms  "
+              f"format warm {result['format_warm_ms']:8.2f} ms  "
+              f"last page {result['last_page_cold_ms']:6.2f} ms, cached {result['last_page_cached_ms']:6.2f} ms")
+    memory = results['memory']
+    print(f"{memory['projects']} projects: whole model {memory['whole_model_kib']:.0f} KiB, "
+          f"nested dicts {memory['nested_dicts_kib']:.0f} KiB")
+    print(f"  project records {memory['project_records_kib']:.0f} KiB, cached blocks {memory['cached_blocks_kib']:.0f} KiB, "
+          f"prefix index {memory['prefix_index_kib']:.0f} KiB, search index {memory['search_index_kib']:.0f} KiB, "
+          f"member and admin indexes {memory['member_admin_indexes_kib']:.0f} KiB")
+    shrink = results['shrink']
+    print(f"shrinking {shrink['projects']} projects to a fifth: {shrink['shards_before']} shards to "
+          f"{shrink['messages_after']} messages, {shrink['fresh_layout_shards']} in a fresh layout")
+    fuzz = results['parser_fuzz']
+    print(f"parser fuzz: {fuzz['cases']} cases, {fuzz['failures']} failures, {fuzz['cases_per_s']:.0f} cases/s")
+    print(f"Results written to {args.output}")
+    if memory['project_records_kib'] > memory['nested_dicts_kib']:
+        print("FAILED: the project records, without their cached blocks and the indexes, take more memory than the nested dicts")
+        raise SystemExit(1)
+    # Neighbouring shards are merged whenever both fit, so no two in a row can be half empty
+    if shrink['messages_after'] > 2 * shrink['fresh_layout_shards']:
+        print("FAILED: the shards were not merged as the board shrank")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+""" Local check of the sharded worker setup and the board writer election, against the fake Discord stand-in
+
+Run from the repository root:
+
+    python -m benchmarks.worker_failover
+
+Boards are spread over guilds on different shards. Two workers connect two
+shards each, and a standby copy of each worker, as left by an overlapping
+restart, connects the same shards. The check verifies that:
+
+- every board is written by exactly one process, the one serving its guild,
+- a standby takes over the boards of a worker that dies once its leases expire,
+  and those of a worker that stops cleanly on its next renewal,
+- the new writer loads the board as the previous writer left it,
+- a writer whose lease lapsed can no longer edit the board's messages.
+
+The writer leases are also contended by real processes, checking that no two
+of them ever consider themselves the holder at the same time.
+"""
+import argparse
+import asyncio
+import dataclasses
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import bot
+from Bot_Config import Bot_Config, Board_Config
+from Writer_Lease import Writer_Lease
+from benchmarks.fake_discord import Fake_API, Fake_Client
+
+SHARD_COUNT = 4
+WORKERS = 2
+# Seconds the lease contended by processes lasts, short for many takeovers
+CONTENTION_LEASE_DURATION = 0.2
+
+
+def guild_id_on_shard(shard_id: int) -> int:
+    # Discord assigns a guild to shard (guild_id >> 22) % shard_count
+    return shard_id << 22
+
+
+def worker_client(discord_side: Fake_Client, config: Bot_Config) -> Fake_Client:
+    """ A worker's view of Discord: the same channels, but only those of guilds on its shards """
+    client = Fake_Client(discord_side.api)
+    for channel_id, channel in discord_side.channels.items():
+        if (channel.guild.id >> 22) % config.shard_count in config.shard_ids:
+            client.channels[channel_id] = channel
+    return client
+
+
+class Worker:
+    """ One simulated bot process: its client, boards and lease keeper """
+    def __init__(self, name: str, discord_side: Fake_Client, config: Bot_Config):
+        self.name = name
+        self.config = config
+        self.client = worker_client(discord_side, config)
+        self.boards = None
+        self.keeper = None
+
+    async def start(self):
+        # Simulated workers share a process, so they are told apart by name
+        self.boards = await bot.setup_boards(self.client, self.config, self.name)
+        self.keeper = asyncio.create_task(bot.keep_board_leases(self.client, self.config, self.boards, self.name))
+
+    def channels(self):
+        return sorted(proj_info.channel_id for proj_info in self.boards)
+
+    async def crash(self):
+        """ Stop without releasing the leases, as a killed process would """
+        self.keeper.cancel()
+        for proj_info in self.boards:
+            await proj_info.stop()
+
+    async def shut_down(self):
+        self.keeper.cancel()
+        bot.release_board_leases(self.boards)
+        for proj_info in self.boards:
+            await proj_info.stop()
+
+
+async def wait_for(condition, timeout: float) -> float:
+    started = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError
+        await asyncio.sleep(0.01)
+    return time.perf_counter() - started
+
+
+async def check_failover(lease_duration: float, lease_path: str) -> dict:
+    api = Fake_API()
+    discord_side = Fake_Client(api)
+    board_configs = []
+    for shard_id in range(SHARD_COUNT):
+        channel = discord_side.add_channel(100 + shard_id, guild_id_on_shard(shard_id))
+        head = await channel.send('# **Projects Info**')
+        board_configs.append(Board_Config(channel.id, head.id))
+
+    base = Bot_Config(token='', projects_info_channel_id=None, projects_info_message_id=None, owner_user_id=1,
+                      boards=tuple(board_configs), shard_count=SHARD_COUNT, workers=WORKERS,
+                      lease_path=lease_path, lease_duration=lease_duration)
+    primaries = [Worker(f'worker {i}', discord_side, dataclasses.replace(base, worker_index=i))
+                 for i in range(WORKERS)]
+    standbys = [Worker(f'standby {i}', discord_side, dataclasses.replace(base, worker_index=i))
+                for i in range(WORKERS)]
+    for worker in primaries + standbys:
+        await worker.start()
+    failures = []
+
+    assignment = {worker.name: worker.channels() for worker in primaries + standbys}
+    written = [channel_id for channels in assignment.values() for channel_id in channels]
+    if sorted(written) != [board.channel_id for board in board_configs]:
+        failures.append(f'boards are not written by exactly one worker each: {assignment}')
+
+    # Every writer adds a project to each of its boards
+    for worker in primaries:
+        for proj_info in worker.boards:
+            await proj_info.create_project(f'project of {worker.name}', '7')
+
+    # Worker 0 dies with its leases held, worker 1 shuts down cleanly
+    dead, stopped = primaries
+    dead_boards = list(dead.boards)
+    await dead.crash()
+    await stopped.shut_down()
+    crash_takeover, clean_takeover = await asyncio.gather(
+        wait_for(lambda: standbys[0].channels() == assignment['worker 0'], lease_duration * 3),
+        wait_for(lambda: standbys[1].channels() == assignment['worker 1'], lease_duration * 3),
+    )
+
+    for standby, previous in zip(standbys, primaries):
+        for proj_info in standby.boards:
+            if f'project of {previous.name}' not in proj_info.board:
+                failures.append(f'{standby.name} lost the changes of {previous.name} to channel {proj_info.channel_id}')
+
+    # The dead worker's lease has lapsed, so a write it still had queued must not reach Discord
+    writes_before = api.count('PATCH') + api.count('POST')
+    try:
+        await dead_boards[0].create_project('late project', '7')
+        failures.append('a worker whose lease lapsed edited its board')
+    except ValueError:
+        pass
+    if api.count('PATCH') + api.count('POST') != writes_before:
+        failures.append('a worker whose lease lapsed made a write call')
+
+    for worker in standbys:
+        await worker.shut_down()
+    return {
+        'assignment': assignment,
+        'crash_takeover_s': crash_takeover,
+        'clean_takeover_s': clean_takeover,
+        'failures': failures,
+    }
+
+
+def contend(lease_path: str, duration: float, seconds: float, results):
+    """ Repeatedly take the lease from one process, recording the times it considered itself the holder """
+    lease = Writer_Lease(lease_path, 'contended', duration, holder=f'process {os.getpid()}')
+    held = []
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if lease.acquire():
+            started = time.time()
+            while lease.held() and time.time() < deadline:
+                time.sleep(duration / 20)
+            held.append((started, time.time()))
+            # Half the holders release the lease, the others let it expire, as a dead process would
+            if random.random() < 0.5:
+                lease.release()
+            time.sleep(random.uniform(0, duration * 1.5))
+        else:
+            time.sleep(duration / 10)
+    lease.close()
+    results.put(held)
+
+
+def check_contention(lease_path: str, processes: int, seconds: float, duration: float = CONTENTION_LEASE_DURATION) -> dict:
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = [context.Process(target=contend, args=(lease_path, duration, seconds, results))
+               for _ in range(processes)]
+    for process in workers:
+        process.start()
+    intervals = sorted(interval for _ in workers for interval in results.get())
+    for process in workers:
+        process.join()
+    overlaps = sum(1 for a, b in zip(intervals, intervals[1:]) if b[0] < a[1])
+    return {'processes': processes, 'holds': len(intervals), 'overlaps': overlaps}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the sharded workers and board writer election locally')
+    parser.add_argument('--lease-duration', type=float, default=2.0, help="Seconds a writer lease lasts")
+    parser.add_argument('--processes', type=int, default=4, help='Processes contending for one lease')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Seconds the processes contend')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        failover = asyncio.run(check_failover(args.lease_duration, os.path.join(directory, 'failover.db')))
+        contention = check_contention(os.path.join(directory, 'contention.db'), args.processes, args.seconds)
+
+    for name, channels in failover['assignment'].items():
+        print(f"{name:<10} writes the boards in channels {channels}")
+    print(f"takeover after a crash {failover['crash_takeover_s']:.2f} s, "
+          f"after a clean shutdown {failover['clean_takeover_s']:.2f} s")
+    print(f"{contention['processes']} processes held the lease {contention['holds']} times, "
+          f"{contention['overlaps']} overlapping holds")
+    for failure in failover['failures']:
+        print(f"FAILED: {failure}")
+    raise SystemExit(1 if failover['failures'] or contention['overlaps'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import re
+from Board import Project
+
+# Discord rejects message content longer than this
+MESSAGE_LIMIT = 2000
+# First line of the first shard message, and of the continuation shards after it
+HEADER = '# **Projects Info**'
+CONTINUATION_HEADER = '# **Projects Info (cont.)**'
+
+# Version of the message layout written by Project.render and format_message_content.
+# Messages without a version marker were written before it existed and are version 0.
+SCHEMA_VERSION = 1
+
+# The version is hidden in the first line of every shard message as zero-width
+# characters: a separator, the version in binary, and a separator again
+MARKER_SEPARATOR = '\u2063'
+MARKER_BITS = ('\u200b', '\u200c')
+MARKER = re.compile(MARKER_SEPARATOR + '([' + ''.join(MARKER_BITS) + ']+)' + MARKER_SEPARATOR)
+
+# One alternative per line kind the parser reads, each wrapped in its own
+# group so that match.lastgroup names the kind. Lines matching none of them,
+# such as headers and the contributors label, are skipped.
+LINE = re.compile(
+    r'^(?:'
+    r'(?P<name_line>\#\#[ \t]+(?P<name>[^\n]*?))'
+    r'|(?P<description_line>[ \t]*Description:[ \t]?(?P<description>[^\n]*?))'
+    r'|(?P<admin_line>[ \t]*Project Admin:[ \t]*(?:<@!?(?P<admin>\d+)>)?[^\n]*?)'
+    r'|(?P<contributor_line>[ \t]*👉[ \t]*<@!?(?P<contributor>\d+)>[^\n]*?)'
+    r')[ \t\r]*$',
+    re.MULTILINE
+)
+
+
+def encode_version(version: int = SCHEMA_VERSION) -> str:
+    """
+    Encode a schema version as an invisible marker.
+
+    :param version: Schema version
+    :return: Zero-width marker text
+    """
+    return MARKER_SEPARATOR + ''.join(MARKER_BITS[int(bit)] for bit in format(version, 'b')) + MARKER_SEPARATOR
+
+
+def decode_version(content: str) -> int:
+    """
+    Read the schema version hidden in a message.
+
+    :param content: Message content
+    :return: Schema version, 0 for messages written before versions were marked
+    """
+    first_line = content.split('\n', 1)[0]
+    match = MARKER.search(first_line)
+    if match is None:
+        return 0
+    return int(''.join(str(MARKER_BITS.index(bit)) for bit in match.group(1)), 2)
+
+
+# Appended to the header of every message written
+SCHEMA_MARKER = encode_version()
+# Longest project block a shard message can hold below either header
+MAX_BLOCK_LENGTH = MESSAGE_LIMIT - max(len(HEADER), len(CONTINUATION_HEADER)) - len(SCHEMA_MARKER) - 1
+
+
+def check_block_length(project: Project):
+    """
+    Check that a project's block fits in a shard message on its own.
+
+    Checked before a project is put on the board, as Discord rejects the edit
+    of a shard that cannot be split below MESSAGE_LIMIT.
+
+    :param project: Project as it would be rendered
+    :return: None
+    """
+    length = len(project.render())
+    if length > MAX_BLOCK_LENGTH:
+        # The error is shown to the user, so a name too long to fit is cut short
+        name = project.name if len(project.name) <= 100 else project.name[:99] + '…'
+        raise ValueError(f"Project {name} would take {length} characters on the board, "
+                         f"more than the {MAX_BLOCK_LENGTH} that fit in one message")
+
+
+def parse_board(content: str):
+    """
+    Parse the projects out of a shard message in one pass.
+
+    Malformed lines are skipped instead of failing the parse: lines before the
+    first project, mentions that are not user mentions, and anything else
+    that is not a project line. Contributors are read from both <@id> and
+    <@!id> mentions. For boards whose names and descriptions have no line
+    breaks and no surrounding whitespace, which is what the commands produce,
+    parsing the formatted board gives the same projects back.
+
+    The projects are returned as a plain list, in message order and with any
+    repeated name kept, so that callers index them into a Board only once.
+
+    :param content: Message content
+    :return: (List of Project, schema version of the message)
+    """
+    version = decode_version(content)
+    projects = []
+    name = None
+    description, admin, contributors = '', '', []
+    for match in LINE.finditer(content):
+        kind = match.lastgroup
+        if kind == 'name_line':
+            if name:
+                projects.append(Project(name, description, admin, contributors))
+            name = match.group('name').strip()
+            description, admin, contributors = '', '', []
+        elif not name:
+            continue
+        elif kind == 'description_line':
+            description = match.group('description').strip()
+        elif kind == 'admin_line':
+            admin = match.group('admin') or ''
+        else:
+            contributors.append(match.group('contributor'))
+    if name:
+        projects.append(Project(name, description, admin, contributors))
+    return projects, version
@@ -0,0 +1,111 @@
+import json
+import yaml
+from Board import Board, Project
+import board_format
+
+EXPORT_FORMATS = ('yaml', 'json')
+# Imports larger than this are rejected before parsing
+MAX_IMPORT_BYTES = 1024 * 1024
+
+
+def board_to_data(board: Board) -> dict:
+    """
+    Convert a board to plain data for export.
+
+    :param board: Board to export
+    :return: Dict with the list of projects in board order
+    """
+    return {
+        'projects': [
+            {
+                'name': project.name,
+                'description': project.description,
+                'admin': project.admin,
+                'contributors': list(project.contributors),
+            }
+            for project in board
+        ]
+    }
+
+
+def dump_board(board: Board, fmt: str = 'yaml') -> str:
+    """
+    Export a board as YAML or JSON.
+
+    :param board: Board to export
+    :param fmt: 'yaml' or 'json'
+    :return: Exported text
+    """
+    data = board_to_data(board)
+    if fmt == 'json':
+        return json.dumps(data, indent=2, ensure_ascii=False)
+    if fmt == 'yaml':
+        return yaml.safe_dump(data, sort_keys=False, allow_unicode=True)
+    raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+
+def user_id_text(value, what: str) -> str:
+    # IDs are exported as strings, but YAML and JSON written by hand may hold them as numbers
+    if isinstance(value, bool) or not isinstance(value, (str, int)) or not str(value).isdigit():
+        raise ValueError(f"{what} must be a Discord user ID, got {value!r}")
+    return str(value)
+
+
+def single_line(value, what: str) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"{what} must be text, got {value!r}")
+    if '\n' in value or '\r' in value:
+        raise ValueError(f"{what} must fit on one line")
+    return value.strip()
+
+
+def board_from_data(data) -> Board:
+    """
+    Validate exported data and build the board it describes.
+
+    The whole document is checked before anything is returned, so an import
+    either applies completely or not at all.
+
+    :param data: Dict with a 'projects' list, or the list itself
+    :return: Board
+    """
+    projects = data.get('projects') if isinstance(data, dict) else data
+    if not isinstance(projects, list):
+        raise ValueError("Expected a list of projects")
+
+    board = Board()
+    for i, entry in enumerate(projects, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Project {i} must be a mapping")
+        name = single_line(entry.get('name'), f"Project {i} name")
+        if not name:
+            raise ValueError(f"Project {i} has no name")
+        if name in board:
+            raise ValueError(f"Project {name} appears more than once")
+        description = single_line(entry.get('description') or '', f"Description of project {name}")
+        admin = entry.get('admin')
+        admin = user_id_text(admin, f"Admin of project {name}") if admin not in (None, '') else ''
+        contributors = entry.get('contributors') or []
+        if not isinstance(contributors, list):
+            raise ValueError(f"Contributors of project {name} must be a list")
+        project = Project(name, description, admin,
+                          [user_id_text(user_id, f"Contributor of project {name}") for user_id in contributors])
+        board_format.check_block_length(project)
+        board.add(project)
+    return board
+
+
+def load_board(text: str) -> Board:
+    """
+    Parse and validate an exported board. JSON is read by the YAML parser too.
+
+    :param text: YAML or JSON text
+    :return: Board
+    """
+    if len(text.encode()) > MAX_IMPORT_BYTES:
+        raise ValueError(f"Import is larger than {MAX_IMPORT_BYTES // 1024} KiB")
+    try:
+        data = yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        raise ValueError(f"Invalid YAML or JSON: {e}")
+    return board_from_data(data)
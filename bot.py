@@ -1,16 +1,32 @@
+from Startup_Timer import startup_timer
 import os
+import memory_report
+
+# Traced from here when launched as a script, so that discord's import is counted too
+if os.getenv('TRACE_MEMORY') == '1':
+    memory_report.start_tracing()
+
+import json
+import asyncio
+import dataclasses
+import hashlib
 import discord
-from discord.ext import commands
 from discord import app_commands
 from Projects_Info import Projects_Info
+from Bot_Config import Bot_Config, Board_Config, config_from_env
+from Board_Registry import Board_Registry
+from Metrics import metrics
+from Request_Scheduler import Request_Scheduler
+from Writer_Lease import Writer_Lease
 import bot_commands
 
-# Load the bot token from the environment variable
-def load_token() -> str:
-    DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
-    if DISCORD_TOKEN is None:
-        raise ValueError("Error: DISCORD_TOKEN environment variable not set.")
-    return DISCORD_TOKEN
+startup_timer.mark('discord imported')
+
+# Fingerprints of the last synced command tree, keyed by application ID
+COMMAND_SYNC_CACHE = ".command_sync_cache.json"
+# Rate limits longer than this are raised to the request scheduler instead of
+# waited out inside discord.py; 30 seconds is the smallest discord.py accepts
+MAX_RATELIMIT_TIMEOUT = 30.0
 
 async def create_projects_info_message(client, channel_id):
     channel = client.get_channel(int(channel_id))
@@ -24,63 +40,385 @@ async def create_projects_info_message(client, channel_id):
     message = await channel.send(initial_message_content)
     return message.id
 
-def init_bot() -> [discord.Client, app_commands.CommandTree]:
-    intents = discord.Intents.default()
-    client = discord.Client(intents=intents)
+def init_bot(low_memory: bool = False, sharded: bool = False, shard_count: int = None,
+             shard_ids=None) -> [discord.Client, app_commands.CommandTree]:
+    """ Create the client and its command tree
+
+    A sharded client is a discord.AutoShardedClient, which connects each of its
+    shards over its own gateway connection. Discord delivers the events and
+    interactions of a guild to the shard the guild belongs to, so workers
+    connecting different shards handle different guilds' commands.
+
+    The low memory profile only subscribes to guild events, which keep the
+    channels and roles needed to check permissions cached, and to guild
+    message events, for the raw edit and delete events of the board messages.
+    It caches no messages and no members other than the bot itself. The bot
+    only needs its channels, the board messages it fetches, and interactions,
+    which carry their own user and member data.
+
+    :param low_memory: Use the low memory profile
+    :param sharded: Connect through discord.AutoShardedClient
+    :param shard_count: Total number of shards, as many as Discord recommends if None
+    :param shard_ids: Shards this client connects, all of them if None
+    :return: Client and command tree
+    """
+    if low_memory:
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.guild_messages = True
+        options = dict(
+            max_messages=None,
+            member_cache_flags=discord.MemberCacheFlags.none(),
+            chunk_guilds_at_startup=False,
+        )
+    else:
+        intents = discord.Intents.default()
+        options = {}
+    if sharded or shard_count or shard_ids:
+        client = discord.AutoShardedClient(intents=intents, shard_count=shard_count, shard_ids=shard_ids,
+                                           max_ratelimit_timeout=MAX_RATELIMIT_TIMEOUT, **options)
+    else:
+        client = discord.Client(intents=intents, max_ratelimit_timeout=MAX_RATELIMIT_TIMEOUT, **options)
     command_tree = app_commands.CommandTree(client)
     return client, command_tree
 
-async def setup_projects_info(client):
-    
+async def setup_projects_info(client, board_config: Board_Config, scheduler: Request_Scheduler = None,
+                              lease: Writer_Lease = None):
+    channel_id = board_config.channel_id
+    message_id = board_config.message_id
+
+    # Optional SQLite store backing the board, only imported when configured
+    store = None
+    if board_config.db_path:
+        from Board_Store import Board_Store
+        store = Board_Store(board_config.db_path)
+
+    proj_info = Projects_Info(client, channel_id, message_id, store=store, scheduler=scheduler, lease=lease)
+    loaded = False
     try:
-        channel_id = int(os.getenv("PROJECTS_INFO_CHANNEL_ID"))
-    except ValueError:
-        raise ValueError("Error: PROJECTS_INFO_CHANNEL_ID environment variable not set or invalid")
+        if not proj_info.verify_permissions():
+            raise ValueError(f"Error: Bot lacks permission to manage the projects info board in channel {channel_id}")
+        if lease is not None and not lease.acquire():
+            raise ValueError(f"The projects info board in channel {channel_id} is written by {lease.current_holder()}")
+
+        if message_id:
+            try:
+                await proj_info.load()
+                loaded = True
+                return proj_info
+            except ValueError as e:
+                await proj_info.stop()
+                print(f"{e}. Creating a new projects info message.")
+        else:
+            print("No message ID specified. Creating a new projects info message.")
+
+        message_id = await create_projects_info_message(client, channel_id)
+        print(f"Projects info message created with ID {message_id}. Update the message ID of channel {channel_id} in the configuration file.")
+
+        proj_info = Projects_Info(client, channel_id, message_id, store=store, scheduler=scheduler, lease=lease)
+        await proj_info.load()
+        loaded = True
+        return proj_info
+    finally:
+        # A board that failed to load gives up its lease, so another worker can take it over
+        if not loaded:
+            await proj_info.stop()
+            if store is not None:
+                store.close()
+            if lease is not None:
+                lease.release()
+                lease.close()
+
+def board_lease(config: Bot_Config, board_config: Board_Config, holder: str = None):
+    """ Lease electing the single writer of a board among the workers
+
+    :param holder: Name of this worker in the leases, the host and process ID by default
+    :return: Writer_Lease, or None when one process runs the bot
+    """
+    if config.workers == 1:
         return None
-    
+    return Writer_Lease(config.lease_path, f'board {board_config.channel_id}', config.lease_duration, holder)
+
+def worker_board_configs(client, config: Bot_Config):
+    """ The configured boards this process can serve
+
+    A worker only sees the guilds of the shards it connects, and Discord sends
+    it the commands of those guilds only, so it serves the boards in them.
+
+    :return: List of Board_Config
+    """
+    if config.workers == 1:
+        return list(config.board_configs)
+    return [board_config for board_config in config.board_configs if client.get_channel(board_config.channel_id)]
+
+async def setup_boards(client, config: Bot_Config, holder: str = None) -> Board_Registry:
+    """ Load every configured board concurrently, skipping boards that fail to load
+
+    With several workers, each board is loaded by the worker that wins its
+    writer lease, see keep_board_leases.
+
+    A board failing with anything but ValueError fails the whole setup, and
+    the boards that did load are stopped and give up their leases.
+
+    :param client: Discord client
+    :param config: Bot configuration
+    :param holder: Name of this worker in the leases, the host and process ID by default
+    :return: Board_Registry of the loaded boards
+    """
+    boards = Board_Registry(Request_Scheduler())
+    results = await asyncio.gather(
+        *[setup_projects_info(client, board_config, boards.scheduler, board_lease(config, board_config, holder))
+          for board_config in worker_board_configs(client, config)],
+        return_exceptions=True,
+    )
+    failure = None
+    for result in results:
+        if isinstance(result, ValueError):
+            print(result)
+        elif isinstance(result, BaseException):
+            failure = failure or result
+        else:
+            boards.add(result.get_channel().guild.id, result)
+    if failure is not None:
+        # The boards that did load are let go too, as the caller sets them all up again
+        for proj_info in boards:
+            await proj_info.stop()
+        release_board_leases(boards)
+        raise failure
+    return boards
+
+async def keep_board_leases(client, config: Bot_Config, boards: Board_Registry, holder: str = None):
+    """ Renew the writer leases of this worker's boards, and take over boards whose writer stopped
+
+    A board whose lease was lost to another worker is dropped, so that only
+    the new writer edits its messages. A board whose lease is free, because its
+    writer released it or stopped renewing it, is loaded by the first worker
+    serving its guild to notice.
+
+    :param client: Discord client
+    :param config: Bot configuration
+    :param boards: Board_Registry of this worker
+    :param holder: Name of this worker in the leases, the host and process ID by default
+    :return: None
+    """
+    while True:
+        # Renewed three times per lease duration, so one late renewal does not lose the lease
+        await asyncio.sleep(config.lease_duration / 3)
+        # Errors are caught per board, so that one board cannot stop the leases of the others being kept
+        for (guild_id, channel_id), proj_info in list(boards.boards.items()):
+            try:
+                if not proj_info.lease.acquire():
+                    print(f"Lost the writer lease of the board in channel {channel_id} to {proj_info.lease.current_holder()}")
+                    boards.remove(guild_id, channel_id)
+                    await proj_info.stop()
+                    proj_info.lease.close()
+            except Exception as e:
+                print(f"Failed to renew the writer lease of the board in channel {channel_id}: {e!r}")
+        for board_config in worker_board_configs(client, config):
+            channel = client.get_channel(board_config.channel_id)
+            if channel is None or boards.get(channel.guild.id, channel.id) is not None:
+                continue
+            try:
+                proj_info = await setup_projects_info(client, board_config, boards.scheduler,
+                                                      board_lease(config, board_config, holder))
+            except ValueError:
+                continue
+            except Exception as e:
+                print(f"Failed to take over the board in channel {channel.id}: {e!r}")
+                continue
+            boards.add(channel.guild.id, proj_info)
+            print(f"Took over writing the board in channel {channel.id}")
+
+def lease_keeper_stopped(task: asyncio.Task):
+    """ Done-callback of the keep_board_leases task, which only stops when cancelled or on a bug
+
+    :return: None
+    """
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error: The writer leases are no longer kept, boards will be taken over by other workers: {task.exception()!r}")
+
+def release_board_leases(boards: Board_Registry):
+    """ Release the writer leases of this worker's boards, so other workers take over without waiting
+
+    :param boards: Board_Registry of this worker
+    :return: None
+    """
+    for proj_info in boards:
+        if proj_info.lease is not None:
+            proj_info.lease.release()
+            proj_info.lease.close()
+
+def run_workers(config: Bot_Config) -> None:
+    """ Run the bot as config.workers processes, each connecting its share of the shards
+
+    Worker i connects the shards i, i + workers, i + 2 * workers and so on, so
+    command handling is spread over the processes by guild. The board writers
+    are elected through leases in config.lease_path.
+
+    :param config: Bot configuration
+    :return: None
+    """
+    import multiprocessing
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=main, args=(dataclasses.replace(config, worker_index=index),), name=f'worker {index}')
+        for index in range(config.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+def command_tree_fingerprint(command_tree: app_commands.CommandTree) -> str:
+    payload = [command.to_dict(command_tree) for command in command_tree.get_commands()]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_command_tree(client, command_tree: app_commands.CommandTree):
+    """ Sync the command tree unless its definitions match the last synced ones
+
+    Delete the COMMAND_SYNC_CACHE file to force a sync.
+
+    :param client: Discord client
+    :param command_tree: Command tree
+    :return: None
+    """
+    fingerprint = command_tree_fingerprint(command_tree)
+    application_id = str(client.application_id)
     try:
-        message_id = int(os.getenv("PROJECTS_INFO_MESSAGE_ID"))
-    except ValueError:
-        raise ValueError("Error: PROJECTS_INFO_MESSAGE_ID environment variable not set or invalid")
-
-    if message_id:
-        proj_info = Projects_Info(client, channel_id, message_id)
-        if not await proj_info.verify_message_editable():
-            print("Specified message is not editable. Creating a new projects info message.")
-            message_id = await create_projects_info_message(client, channel_id)
-            os.environ["PROJECTS_INFO_MESSAGE_ID"] = str(message_id)
-    else:
-        print("No message ID specified. Creating a new projects info message.")
-        message_id = await create_projects_info_message(client, channel_id)
-        os.environ["PROJECTS_INFO_MESSAGE_ID"] = str(message_id)
-        print(f"Projects info message created with ID {message_id}")
+        with open(COMMAND_SYNC_CACHE, "r") as f:
+            synced = json.load(f)
+    except (IOError, ValueError):
+        synced = {}
+
+    if synced.get(application_id) == fingerprint:
+        print("Command tree unchanged since last sync, skipping sync.")
+        return
 
-    return Projects_Info(client, channel_id, message_id)
+    await command_tree.sync()
+    synced[application_id] = fingerprint
+    with open(COMMAND_SYNC_CACHE, "w") as f:
+        json.dump(synced, f)
 
-def main() -> None:
-    client, command_tree = init_bot()
+def main(config: Bot_Config = None) -> None:
+    """ Run the bot
 
-    DISCORD_TOKEN = load_token()
-    if DISCORD_TOKEN is None:
+    :param config: Bot configuration, read from the environment variables if not given
+    :return: None
+    """
+    if config is None:
+        try:
+            config = config_from_env()
+        except ValueError as e:
+            print(e)
+            return
+
+    if config.workers > 1 and config.worker_index is None:
+        run_workers(config)
         return
+    if config.worker_index is not None:
+        print(f"Worker {config.worker_index} connecting shards {list(config.shard_ids)} of {config.shard_count}")
+
+    if config.metrics_enabled:
+        metrics.enable()
+
+    if config.trace_memory:
+        memory_report.start_tracing()
+
+    client, command_tree = init_bot(config.low_memory, config.sharded, config.shard_count, config.shard_ids)
+    startup_timer.mark('client created')
+
+    started = False
+    starting = False
+    boards = None
+    lease_keeper = None
+
+    def board_of(payload):
+        return boards.get(payload.guild_id, payload.channel_id) if boards is not None else None
+
+    # Raw events fire whether or not the message is cached, so they work with the message cache disabled
+    @client.event
+    async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+        proj_info = board_of(payload)
+        if proj_info is not None:
+            try:
+                await proj_info.message_edited(payload.message_id, payload.data.get('content'))
+            except (discord.HTTPException, ValueError) as e:
+                print(e)
+
+    @client.event
+    async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+        proj_info = board_of(payload)
+        if proj_info is not None:
+            try:
+                await proj_info.message_deleted([payload.message_id])
+            except (discord.HTTPException, ValueError) as e:
+                print(e)
+
+    @client.event
+    async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+        proj_info = board_of(payload)
+        if proj_info is not None:
+            try:
+                # One mutation for the whole purge, so no shard is deleted twice
+                await proj_info.message_deleted(payload.message_ids)
+            except (discord.HTTPException, ValueError) as e:
+                print(e)
 
     @client.event
     async def on_ready():
+        # on_ready also fires after gateway reconnects; set up only once per process
+        nonlocal started, starting, boards, lease_keeper
+        if started or starting:
+            print(f'Bot reconnected as {client.user}')
+            return
+        starting = True
+        startup_timer.mark('gateway ready')
+
         try:
-            proj_info = await setup_projects_info(client)
-            if proj_info is None:
-                await client.close()
-                return
-        except ValueError as e:
-            print(e)
+            boards = await setup_boards(client, config)
+        except Exception as e:
+            # Left unset up, so that the on_ready after the next reconnect tries again
+            print(f"Error: Failed to set up the projects info boards, retrying on reconnect: {e!r}")
+            return
+        finally:
+            starting = False
+        started = True
+        # A worker may have no board yet, while other workers write them or their guilds are on other shards
+        if not boards and config.workers == 1:
+            print("Error: No projects info board could be loaded")
             await client.close()
             return
+        if config.workers > 1:
+            lease_keeper = asyncio.create_task(keep_board_leases(client, config, boards))
+            lease_keeper.add_done_callback(lease_keeper_stopped)
+
+        startup_timer.mark('boards loaded')
 
-        bot_commands.add_commands(command_tree, proj_info)
-        await command_tree.sync()
+        bot_commands.add_commands(command_tree, boards, config.owner_user_id,
+                                  config.response_budget, config.command_timeout)
+        # Commands are global to the application, so one worker syncs them for all
+        if not config.worker_index:
+            await sync_command_tree(client, command_tree)
+        startup_timer.mark('commands synced')
+
+        if config.metrics_port:
+            # Each worker serves its own metrics, on consecutive ports
+            metrics_port = config.metrics_port + (config.worker_index or 0)
+            await metrics.serve_prometheus(metrics_port)
+            print(f'Serving metrics on http://127.0.0.1:{metrics_port}/metrics')
+        if config.metrics_log_interval:
+            metrics.start_logging(config.metrics_log_interval)
+        if config.memory_log_interval:
+            memory_report.start_logging(config.memory_log_interval, client)
         print(f'Bot connected as {client.user}')
+        print(startup_timer.report())
+        print(memory_report.format_memory_report(memory_report.memory_snapshot(client)))
 
-    client.run(DISCORD_TOKEN)
+    try:
+        client.run(config.token)
+    finally:
+        if boards is not None:
+            release_board_leases(boards)
 
 if __name__ == "__main__":
     main()
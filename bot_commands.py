@@ -1,27 +1,283 @@
+import asyncio
+import functools
+import io
+import re
+from typing import Literal, NamedTuple, Optional
 import discord
 from discord import app_commands
-from Projects_Info import Projects_Info
-import os
+import board_io
+import memory_report
+from Board_Registry import Board_Registry
+from Metrics import metrics
+from Project_Browser import Project_Browser
+from Request_Scheduler import INTERACTION
 
-OWNER_USER_ID = int(os.getenv('OWNER_USER_ID'))
+# Set by add_commands from the bot configuration
+OWNER_USER_ID = None
+# Seconds a command may take before it defers; Discord fails interactions not answered within 3
+RESPONSE_BUDGET = 2.0
+# Seconds a deferred command may take before the user is told it is still running
+COMMAND_TIMEOUT = 30.0
+# Request_Scheduler shared with the boards, set by add_commands
+REQUEST_SCHEDULER = None
+# Commands still running after their deadline, kept referenced until they finish
+LATE_COMMANDS = set()
 
+# Discord limits autocomplete choices to 25 and choice values to 100 characters
+MAX_CHOICES = 25
+MAX_CHOICE_LENGTH = 100
 
-def add_cmd_see_projects(tree: app_commands.CommandTree):
+# Largest number of members or projects a single bulk command accepts. A project's
+# block holds about 60 contributors, so one bulk command alone cannot overflow it.
+MAX_BULK_MEMBERS = 50
+MAX_BULK_PROJECTS = 25
+# Room left for the rest of a reply listing projects or members, within Discord's 2000 characters
+MAX_LIST_LENGTH = 1800
+# Results listed by search_projects, and the characters of each description shown
+MAX_SEARCH_RESULTS = 10
+SEARCH_SNIPPET_LENGTH = 120
+USER_ENTRY = re.compile(r'<@!?(\d+)>|(\d+)')
+
+
+def project_name_autocomplete(boards: Board_Registry):
+    """ Build an autocomplete callback suggesting project names
+
+    Suggestions come from the in-memory prefix index of the interaction's
+    board, so no REST call is made.
+
+    :param boards: Board_Registry of the bot
+    :return: Autocomplete callback
+    """
+    @metrics.instrument_command
+    async def autocomplete(interaction: discord.Interaction, current: str):
+        proj_info = boards.resolve(interaction.guild_id, interaction.channel_id)
+        if proj_info is None:
+            return []
+        return [
+            app_commands.Choice(name=name, value=name)
+            for name in proj_info.complete_proj_name(current, MAX_CHOICES)
+            if len(name) <= MAX_CHOICE_LENGTH
+        ]
+    return autocomplete
+
+
+class Reply(NamedTuple):
+    """ Response a command's work returns, sent by respond() """
+    content: str
+    ephemeral: bool = False
+    file: Optional[discord.File] = None
+    embed: Optional[discord.Embed] = None
+    view: Optional[discord.ui.View] = None
+
+    def send_kwargs(self) -> dict:
+        kwargs = {'ephemeral': self.ephemeral}
+        if self.file is not None:
+            kwargs['file'] = self.file
+        if self.embed is not None:
+            kwargs['embed'] = self.embed
+        if self.view is not None:
+            kwargs['view'] = self.view
+        return kwargs
+
+
+def join_limited(items, limit: int = MAX_LIST_LENGTH) -> str:
+    """ Join items with commas, cutting the list short to fit within `limit` characters
+
+    :param items: Strings to list
+    :param limit: Maximum length of the result
+    :return: Comma separated items, ending with a count of those left out
+    """
+    items = list(items)
+    text = ''
+    for i, item in enumerate(items):
+        candidate = f'{text}, {item}' if text else item
+        if len(candidate) > limit:
+            return f'{text} and {len(items) - i} more'
+        text = candidate
+    return text
+
+
+def parse_user_ids(text: str):
+    """ Parse the members of a bulk command, given as mentions or user IDs
+
+    :param text: Mentions or IDs separated by spaces or commas
+    :return: (list of unique user IDs in order, list of entries that are neither)
+    """
+    user_ids = []
+    invalid = []
+    for entry in re.split(r'[\s,]+|(?<=>)(?=<)', text.strip()):
+        if not entry:
+            continue
+        match = USER_ENTRY.fullmatch(entry)
+        if match is None:
+            invalid.append(entry)
+            continue
+        user_id = int(match.group(1) or match.group(2))
+        if user_id not in user_ids:
+            user_ids.append(user_id)
+    return user_ids, invalid
+
+
+def parse_member_list(text: str):
+    """ Validate the member list of a bulk command
+
+    :return: (list of user IDs, or None, and a Reply rejecting the list, or None)
+    """
+    user_ids, invalid = parse_user_ids(text)
+    if invalid:
+        return None, Reply(f'Not a member mention or ID: {", ".join(invalid)}', ephemeral=True)
+    if not user_ids:
+        return None, Reply('No members given.', ephemeral=True)
+    if len(user_ids) > MAX_BULK_MEMBERS:
+        return None, Reply(f'At most {MAX_BULK_MEMBERS} members can be given at once.', ephemeral=True)
+    return user_ids, None
+
+
+async def with_board(boards: Board_Registry, interaction: discord.Interaction, work):
+    """ Run a command's work against the board of the guild and channel it was used in
+
+    :param boards: Board_Registry of the bot
+    :param interaction: Interaction being answered
+    :param work: Coroutine function taking the Projects_Info and returning a Reply
+    :return: Reply
+    """
+    proj_info = boards.resolve(interaction.guild_id, interaction.channel_id)
+    if proj_info is None:
+        return Reply('No projects board is set up for this server.', ephemeral=True)
+    try:
+        return await work(proj_info)
+    except ValueError as e:
+        # Raised by the board when it cannot be written, e.g. for a project too long for a message
+        print(f"Projects board in channel {proj_info.channel_id} was not updated: {e}")
+        return Reply(f'The projects board could not be updated: {e}', ephemeral=True)
+
+
+async def send_response(call, *args, **kwargs):
+    """ Send an interaction response ahead of any queued board traffic
+
+    :param call: Response method, e.g. interaction.response.send_message
+    :return: Result of the call
+    """
+    if REQUEST_SCHEDULER is None:
+        return await call(*args, **kwargs)
+    return await REQUEST_SCHEDULER.submit(INTERACTION, None, functools.partial(call, *args, **kwargs))
+
+
+def report_late_failure(interaction: discord.Interaction, task: asyncio.Task):
+    """ Done-callback of a command that outlived COMMAND_TIMEOUT, telling the user if it failed after all
+
+    :return: None
+    """
+    LATE_COMMANDS.discard(task)
+    if task.cancelled() or task.exception() is None:
+        return
+    print(f"Command used in channel {interaction.channel_id} failed after timing out: {task.exception()!r}")
+    # A second follow-up, so unlike the first it can be ephemeral whatever the defer was
+    follow_up = asyncio.ensure_future(send_response(
+        interaction.followup.send, 'Something went wrong while updating the projects board.', ephemeral=True))
+    LATE_COMMANDS.add(follow_up)
+    follow_up.add_done_callback(LATE_COMMANDS.discard)
+
+
+def remember_message(reply: Reply, message):
+    """ Tell the view of a sent reply which message it is on, so that it can remove itself once it times out
+
+    :param reply: Reply that was sent
+    :param message: Message the reply was sent as
+    :return: None
+    """
+    if reply.view is not None:
+        reply.view.message = message
+
+
+async def send_follow_up(interaction: discord.Interaction, reply: Reply, deferred_ephemeral: bool):
+    """ Send the Reply of a deferred command as a follow-up
+
+    The first follow-up replaces the "thinking" message and takes its visibility,
+    so an ephemeral reply to a public defer first deletes that message and is
+    then sent on its own, only to the user.
+
+    :param interaction: Interaction being answered
+    :param reply: Reply to send
+    :param deferred_ephemeral: Whether the interaction was deferred ephemerally
+    :return: None
+    """
+    if reply.ephemeral and not deferred_ephemeral:
+        try:
+            await send_response(interaction.delete_original_response)
+        except discord.HTTPException as e:
+            print(f"Failed to delete the response to an interaction: {e}")
+    message = await send_response(interaction.followup.send, reply.content, wait=True, **reply.send_kwargs())
+    remember_message(reply, message)
+
+
+async def respond(interaction: discord.Interaction, work, ephemeral: bool = False):
+    """ Run a command's work and deliver its Reply within the interaction deadline
+
+    Work finishing within RESPONSE_BUDGET is answered directly. Slower work,
+    usually waiting on a board edit, is deferred and its reply delivered as a
+    follow-up message. Deferred work that outlives COMMAND_TIMEOUT keeps running,
+    the user is told the board will catch up, and is told again if it fails.
+
+    :param interaction: Interaction being answered
+    :param work: Coroutine returning a Reply
+    :param ephemeral: Whether the command's successful reply is only shown to the user,
+                      which a deferred response has to know up front
+    :return: None
+    """
+    failed = Reply('Something went wrong while updating the projects board.', ephemeral=True)
+    task = asyncio.ensure_future(work)
+    done, _ = await asyncio.wait({task}, timeout=RESPONSE_BUDGET)
+    if task in done:
+        try:
+            reply = task.result()
+        except Exception:
+            await send_response(interaction.response.send_message, failed.content, **failed.send_kwargs())
+            raise
+        response = await send_response(interaction.response.send_message, reply.content, **reply.send_kwargs())
+        remember_message(reply, response.resource)
+        return
+
+    # Quick rejections are answered above, so what is left is normally the success message
+    await send_response(interaction.response.defer, thinking=True, ephemeral=ephemeral)
+    done, _ = await asyncio.wait({task}, timeout=COMMAND_TIMEOUT - RESPONSE_BUDGET)
+    if task not in done:
+        LATE_COMMANDS.add(task)
+        task.add_done_callback(functools.partial(report_late_failure, interaction))
+        await send_response(interaction.followup.send, 'Still working on it, the projects board will be updated shortly.')
+        return
+    try:
+        reply = task.result()
+    except Exception:
+        await send_follow_up(interaction, failed, ephemeral)
+        raise
+    await send_follow_up(interaction, reply, ephemeral)
+
+
+def add_cmd_see_projects(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the see_projects command to the command tree
     
-    Command description: directs the user to the projects-info channel
+    Command description: browse the projects page by page, and find the projects-info channel
     
     Access: All users
     
     :param tree: Command tree
+    :param boards: Board_Registry of the bot
     :return: None 
     """
     @tree.command(name='see_projects', description='Provides information about projects')
-    async def see_projects(interaction: discord.Interaction):
-        await interaction.response.send_message(f'{interaction.user.mention} see #projects-info')
+    @app_commands.describe(page='Page to open, the first by default')
+    @metrics.instrument_command
+    async def see_projects(interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1):
+        async def work(proj_info):
+            browser = Project_Browser(proj_info, interaction.user.id, page - 1)
+            return Reply(f'{interaction.user.mention} see <#{proj_info.channel_id}>',
+                         embed=browser.embed(), view=browser)
+
+        await respond(interaction, with_board(boards, interaction, work))
 
 
-def add_cmd_set_proj_desc(tree: app_commands.CommandTree, proj_info: Projects_Info):
+def add_cmd_set_proj_desc(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the set_proj_desc command to the command tree
     
     Command description: Set the project description
@@ -29,21 +285,25 @@ def add_cmd_set_proj_desc(tree: app_commands.CommandTree, proj_info: Projects_In
     Access: Owner or project admin
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
     :return: None
     """
     @tree.command(name='set_proj_desc', description='Set the project description')
     @app_commands.describe(proj='Project name', new_desc='New project description')
+    @app_commands.autocomplete(proj=project_name_autocomplete(boards))
+    @metrics.instrument_command
     async def set_proj_desc(interaction: discord.Interaction, proj: str, new_desc: str):
-        if interaction.user.id != OWNER_USER_ID and interaction.user.id != await proj_info.get_proj_admin(proj): 
-            await interaction.response.send_message('Only the owner or project admin can set the description.', ephemeral=True)
-            return
-        
-        await proj_info.update_proj_desc(proj, new_desc)
-        await interaction.response.send_message(f'Updated project {proj} description to "{new_desc}"')
+        async def work(proj_info):
+            if interaction.user.id != OWNER_USER_ID and interaction.user.id != await proj_info.get_proj_admin(proj):
+                return Reply('Only the owner or project admin can set the description.', ephemeral=True)
+
+            await proj_info.update_proj_desc(proj, new_desc)
+            return Reply(f'Updated project {proj} description to "{new_desc}"')
 
+        await respond(interaction, with_board(boards, interaction, work))
 
-def add_cmd_get_proj_desc(tree: app_commands.CommandTree, proj_info: Projects_Info):
+
+def add_cmd_get_proj_desc(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the get_proj_desc command to the command tree
     
     Command description: Get the project description
@@ -51,19 +311,24 @@ def add_cmd_get_proj_desc(tree: app_commands.CommandTree, proj_info: Projects_In
     Access: All users
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
     :return: None
     """
     @tree.command(name='get_proj_desc', description='Get the project description')
     @app_commands.describe(proj='Project name')
+    @app_commands.autocomplete(proj=project_name_autocomplete(boards))
+    @metrics.instrument_command
     async def get_proj_desc(interaction: discord.Interaction, proj: str):
-        description = await proj_info.get_proj_desc(proj)
-        if description:
-            await interaction.response.send_message(f'Description for project {proj}: {description}')
-        else:
-            await interaction.response.send_message(f'No description found for project {proj}')
+        async def work(proj_info):
+            description = await proj_info.get_proj_desc(proj)
+            if description:
+                return Reply(f'Description for project {proj}: {description}')
+            else:
+                return Reply(f'No description found for project {proj}')
+
+        await respond(interaction, with_board(boards, interaction, work))
 
-def add_cmd_set_proj_name(tree: app_commands.CommandTree, proj_info: Projects_Info):
+def add_cmd_set_proj_name(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the update_proj_name command to the command tree
     
     Command description: Update the project name
@@ -71,24 +336,28 @@ def add_cmd_set_proj_name(tree: app_commands.CommandTree, proj_info: Projects_In
     Access: Owner or project admin
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
     :return: None
     """
     @tree.command(name='set_proj_name', description='Update the project name')
     @app_commands.describe(proj='Project name', new_name='New project name')
+    @app_commands.autocomplete(proj=project_name_autocomplete(boards))
+    @metrics.instrument_command
     async def set_proj_name(interaction: discord.Interaction, proj: str, new_name: str):
-        if interaction.user.id != OWNER_USER_ID and interaction.user.id != await proj_info.get_proj_admin(proj):
-            await interaction.response.send_message('Only the owner or project admin can update project names.', ephemeral=True)
-            return
+        async def work(proj_info):
+            if interaction.user.id != OWNER_USER_ID and interaction.user.id != await proj_info.get_proj_admin(proj):
+                return Reply('Only the owner or project admin can update project names.', ephemeral=True)
 
-        success = await proj_info.update_proj_name(proj, new_name)
-        if success:
-            await interaction.response.send_message(f'Updated project name from {proj} to {new_name}.')
-        else:
-            await interaction.response.send_message(f'Project {proj} does not exist.', ephemeral=True)
+            success = await proj_info.update_proj_name(proj, new_name)
+            if success:
+                return Reply(f'Updated project name from {proj} to {new_name}.')
+            else:
+                return Reply(f'Project {proj} does not exist.', ephemeral=True)
 
+        await respond(interaction, with_board(boards, interaction, work))
 
-def add_cmd_create_project(tree: app_commands.CommandTree, proj_info: Projects_Info):
+
+def add_cmd_create_project(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the create_project command to the command tree
     
     Command description: Create a new project
@@ -96,25 +365,26 @@ def add_cmd_create_project(tree: app_commands.CommandTree, proj_info: Projects_I
     Access: Owner
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
     :return: None
     """
     @tree.command(name='create_project', description='Create a new project')
     @app_commands.describe(pname='Project name', padmin='Project admin')
+    @metrics.instrument_command
     async def create_project(interaction: discord.Interaction, pname: str, padmin: discord.User):
-        if interaction.user.id != OWNER_USER_ID:
-            await interaction.response.send_message('Only the owner can create new projects.', ephemeral=True)
-            return
+        async def work(proj_info):
+            if interaction.user.id != OWNER_USER_ID:
+                return Reply('Only the owner can create new projects.', ephemeral=True)
+
+            if await proj_info.create_project(pname, padmin.id):
+                return Reply(f'Project {pname} created with admin {padmin.mention}.')
+            else:
+                return Reply(f'Project {pname} already exists.', ephemeral=True)
 
-        if await proj_info.project_exists(pname):
-            await interaction.response.send_message(f'Project {pname} already exists.', ephemeral=True)
-        else:
-            await proj_info.update_proj_desc(pname, '')
-            await proj_info.update_proj_admin(pname, padmin.id)
-            await interaction.response.send_message(f'Project {pname} created with admin {padmin.mention}.')
+        await respond(interaction, with_board(boards, interaction, work))
 
 
-def add_cmd_project_add_member(tree: app_commands.CommandTree, proj_info: Projects_Info):
+def add_cmd_project_add_member(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the project_add_member command to the command tree
     
     Command description: Add a member to a project
@@ -122,25 +392,29 @@ def add_cmd_project_add_member(tree: app_commands.CommandTree, proj_info: Projec
     Access: Owner or project admin
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
     :return: None
     """
     @tree.command(name='project_add_member', description='Add a member to a project')
     @app_commands.describe(pname='Project name', new_member='New member')
+    @app_commands.autocomplete(pname=project_name_autocomplete(boards))
+    @metrics.instrument_command
     async def project_add_member(interaction: discord.Interaction, pname: str, new_member: discord.User):
-        project_admin_id = await proj_info.get_proj_admin(pname)
-        if interaction.user.id != OWNER_USER_ID and interaction.user.id != project_admin_id:
-            await interaction.response.send_message('Only the owner or project admin can add members.', ephemeral=True)
-            return
+        async def work(proj_info):
+            project_admin_id = await proj_info.get_proj_admin(pname)
+            if interaction.user.id != OWNER_USER_ID and interaction.user.id != project_admin_id:
+                return Reply('Only the owner or project admin can add members.', ephemeral=True)
+
+            success = await proj_info.add_proj_contributor(pname, new_member.id)
+            if success:
+                return Reply(f'Added {new_member.mention} to project {pname}.')
+            else:
+                return Reply(f'{new_member.mention} is already a member of project {pname}.', ephemeral=True)
 
-        success = await proj_info.add_proj_contributor(pname, new_member.id)
-        if success:
-            await interaction.response.send_message(f'Added {new_member.mention} to project {pname}.')
-        else:
-            await interaction.response.send_message(f'{new_member.mention} is already a member of project {pname}.', ephemeral=True)
+        await respond(interaction, with_board(boards, interaction, work))
 
 
-def add_cmd_project_kick_member(tree: app_commands.CommandTree, proj_info: Projects_Info):
+def add_cmd_project_kick_member(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the project_kick_member command to the command tree
     
     Command description: Kick a member from a project
@@ -148,25 +422,29 @@ def add_cmd_project_kick_member(tree: app_commands.CommandTree, proj_info: Proje
     Access: Owner or project admin
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
     :return: None
     """
     @tree.command(name='project_kick_member', description='Kick a member from a project')
     @app_commands.describe(pname='Project name', member_name='Member name')
+    @app_commands.autocomplete(pname=project_name_autocomplete(boards))
+    @metrics.instrument_command
     async def project_kick_member(interaction: discord.Interaction, pname: str, member_name: discord.User):
-        project_admin_id = await proj_info.get_proj_admin(pname)
-        if interaction.user.id != OWNER_USER_ID and interaction.user.id != project_admin_id:
-            await interaction.response.send_message('Only the owner or project admin can kick members.', ephemeral=True)
-            return
+        async def work(proj_info):
+            project_admin_id = await proj_info.get_proj_admin(pname)
+            if interaction.user.id != OWNER_USER_ID and interaction.user.id != project_admin_id:
+                return Reply('Only the owner or project admin can kick members.', ephemeral=True)
 
-        success = await proj_info.remove_proj_contributor(pname, member_name.id)
-        if success:
-            await interaction.response.send_message(f'Removed {member_name.mention} from project {pname}.')
-        else:
-            await interaction.response.send_message(f'{member_name.mention} is not a member of project {pname}.', ephemeral=True)
+            success = await proj_info.remove_proj_contributor(pname, member_name.id)
+            if success:
+                return Reply(f'Removed {member_name.mention} from project {pname}.')
+            else:
+                return Reply(f'{member_name.mention} is not a member of project {pname}.', ephemeral=True)
 
+        await respond(interaction, with_board(boards, interaction, work))
 
-def add_cmd_remove_project(tree: app_commands.CommandTree, proj_info: Projects_Info):
+
+def add_cmd_remove_project(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the remove_project command to the command tree
     
     Command description: Remove a project
@@ -174,21 +452,25 @@ def add_cmd_remove_project(tree: app_commands.CommandTree, proj_info: Projects_I
     Access: Owner
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
     :return: None
     """
     @tree.command(name='remove_project', description='Remove a project')
     @app_commands.describe(pname='Project name')
+    @app_commands.autocomplete(pname=project_name_autocomplete(boards))
+    @metrics.instrument_command
     async def remove_project(interaction: discord.Interaction, pname: str):
-        if interaction.user.id != OWNER_USER_ID:
-            await interaction.response.send_message('Only the owner can remove projects.', ephemeral=True)
-            return
+        async def work(proj_info):
+            if interaction.user.id != OWNER_USER_ID:
+                return Reply('Only the owner can remove projects.', ephemeral=True)
+
+            await proj_info.remove_project(pname)
+            return Reply(f'Project {pname} has been removed.')
 
-        await proj_info.remove_project(pname)
-        await interaction.response.send_message(f'Project {pname} has been removed.')
+        await respond(interaction, with_board(boards, interaction, work))
 
 
-def add_cmd_change_proj_admin(tree: app_commands.CommandTree, proj_info: Projects_Info):
+def add_cmd_change_proj_admin(tree: app_commands.CommandTree, boards: Board_Registry):
     """ Add the change_proj_admin command to the command tree
     
     Command description: Change the project admin
@@ -196,34 +478,337 @@ def add_cmd_change_proj_admin(tree: app_commands.CommandTree, proj_info: Project
     Access: Owner
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
     :return: None
     """
     @tree.command(name='change_proj_admin', description='Change the project admin')
     @app_commands.describe(proj='Project name', new_admin='New admin')
+    @app_commands.autocomplete(proj=project_name_autocomplete(boards))
+    @metrics.instrument_command
     async def change_proj_admin(interaction: discord.Interaction, proj: str, new_admin: discord.User):
-        project_admin_id = await proj_info.get_proj_admin(proj)
-        if interaction.user.id != OWNER_USER_ID and interaction.user.id != project_admin_id:
-            await interaction.response.send_message('Only the owner or current project admin can change the admin.', ephemeral=True)
-            return
+        async def work(proj_info):
+            project_admin_id = await proj_info.get_proj_admin(proj)
+            if interaction.user.id != OWNER_USER_ID and interaction.user.id != project_admin_id:
+                return Reply('Only the owner or current project admin can change the admin.', ephemeral=True)
 
-        await proj_info.update_proj_admin(proj, new_admin.id)
-        await interaction.response.send_message(f'Changed admin for project {proj} to {new_admin.mention}.')
+            await proj_info.update_proj_admin(proj, new_admin.id)
+            return Reply(f'Changed admin for project {proj} to {new_admin.mention}.')
 
+        await respond(interaction, with_board(boards, interaction, work))
 
-def add_commands(tree: app_commands.CommandTree, proj_info: Projects_Info):
+
+def add_cmd_create_projects(tree: app_commands.CommandTree, boards: Board_Registry):
+    """ Add the create_projects command to the command tree
+    
+    Command description: Create several projects at once
+    
+    Access: Owner
+    
+    :param tree: Command tree
+    :param boards: Board_Registry of the bot
+    :return: None
+    """
+    @tree.command(name='create_projects', description='Create several projects at once')
+    @app_commands.describe(pnames='Project names separated by semicolons', padmin='Admin of the new projects')
+    @metrics.instrument_command
+    async def create_projects(interaction: discord.Interaction, pnames: str, padmin: discord.User):
+        async def work(proj_info):
+            if interaction.user.id != OWNER_USER_ID:
+                return Reply('Only the owner can create new projects.', ephemeral=True)
+
+            names = list(dict.fromkeys(name.strip() for name in pnames.split(';') if name.strip()))
+            if not names:
+                return Reply('No project names given.', ephemeral=True)
+            if len(names) > MAX_BULK_PROJECTS:
+                return Reply(f'At most {MAX_BULK_PROJECTS} projects can be created at once.', ephemeral=True)
+
+            created = await proj_info.create_projects(names, padmin.id)
+            if not created:
+                return Reply('All of these projects already exist.', ephemeral=True)
+            existing = [name for name in names if name not in created]
+            message = f'Created projects {", ".join(created)} with admin {padmin.mention}.'
+            if existing:
+                message += f' Already existing: {", ".join(existing)}.'
+            return Reply(message)
+
+        await respond(interaction, with_board(boards, interaction, work))
+
+
+def add_cmd_project_add_members(tree: app_commands.CommandTree, boards: Board_Registry):
+    """ Add the project_add_members command to the command tree
+    
+    Command description: Add several members to a project
+    
+    Access: Owner or project admin
+    
+    :param tree: Command tree
+    :param boards: Board_Registry of the bot
+    :return: None
+    """
+    @tree.command(name='project_add_members', description='Add several members to a project')
+    @app_commands.describe(pname='Project name', members='Member mentions or IDs separated by spaces')
+    @app_commands.autocomplete(pname=project_name_autocomplete(boards))
+    @metrics.instrument_command
+    async def project_add_members(interaction: discord.Interaction, pname: str, members: str):
+        async def work(proj_info):
+            if not await proj_info.project_exists(pname):
+                return Reply(f'Project {pname} does not exist.', ephemeral=True)
+            if interaction.user.id != OWNER_USER_ID and interaction.user.id != await proj_info.get_proj_admin(pname):
+                return Reply('Only the owner or project admin can add members.', ephemeral=True)
+
+            user_ids, rejection = parse_member_list(members)
+            if rejection is not None:
+                return rejection
+
+            added = await proj_info.add_proj_contributors(pname, user_ids)
+            if added is None:
+                return Reply(f'Project {pname} does not exist.', ephemeral=True)
+            if not added:
+                return Reply(f'They are all already members of project {pname}.', ephemeral=True)
+            return Reply(f'Added {" ".join(f"<@{user_id}>" for user_id in added)} to project {pname}.')
+
+        await respond(interaction, with_board(boards, interaction, work))
+
+
+def add_cmd_project_kick_members(tree: app_commands.CommandTree, boards: Board_Registry):
+    """ Add the project_kick_members command to the command tree
+    
+    Command description: Kick several members from a project
+    
+    Access: Owner or project admin
+    
+    :param tree: Command tree
+    :param boards: Board_Registry of the bot
+    :return: None
+    """
+    @tree.command(name='project_kick_members', description='Kick several members from a project')
+    @app_commands.describe(pname='Project name', members='Member mentions or IDs separated by spaces')
+    @app_commands.autocomplete(pname=project_name_autocomplete(boards))
+    @metrics.instrument_command
+    async def project_kick_members(interaction: discord.Interaction, pname: str, members: str):
+        async def work(proj_info):
+            if not await proj_info.project_exists(pname):
+                return Reply(f'Project {pname} does not exist.', ephemeral=True)
+            if interaction.user.id != OWNER_USER_ID and interaction.user.id != await proj_info.get_proj_admin(pname):
+                return Reply('Only the owner or project admin can kick members.', ephemeral=True)
+
+            user_ids, rejection = parse_member_list(members)
+            if rejection is not None:
+                return rejection
+
+            removed = await proj_info.remove_proj_contributors(pname, user_ids)
+            if removed is None:
+                return Reply(f'Project {pname} does not exist.', ephemeral=True)
+            if not removed:
+                return Reply(f'None of them are members of project {pname}.', ephemeral=True)
+            return Reply(f'Removed {" ".join(f"<@{user_id}>" for user_id in removed)} from project {pname}.')
+
+        await respond(interaction, with_board(boards, interaction, work))
+
+
+def add_cmd_export_board(tree: app_commands.CommandTree, boards: Board_Registry):
+    """ Add the export_board command to the command tree
+    
+    Command description: Export the projects board as a YAML or JSON file
+    
+    Access: All users
+    
+    :param tree: Command tree
+    :param boards: Board_Registry of the bot
+    :return: None
+    """
+    @tree.command(name='export_board', description='Export the projects board as a YAML or JSON file')
+    @app_commands.describe(fmt='File format')
+    @metrics.instrument_command
+    async def export_board(interaction: discord.Interaction, fmt: Literal['yaml', 'json'] = 'yaml'):
+        async def work(proj_info):
+            content = proj_info.export_board(fmt).encode()
+            file = discord.File(io.BytesIO(content), filename=f'projects_board.{fmt}')
+            return Reply(f'Exported {len(proj_info.board)} projects.', ephemeral=True, file=file)
+
+        await respond(interaction, with_board(boards, interaction, work), ephemeral=True)
+
+
+def add_cmd_import_board(tree: app_commands.CommandTree, boards: Board_Registry):
+    """ Add the import_board command to the command tree
+    
+    Command description: Replace the projects board with an exported YAML or JSON file
+    
+    Access: Owner
+    
+    :param tree: Command tree
+    :param boards: Board_Registry of the bot
+    :return: None
+    """
+    @tree.command(name='import_board', description='Replace the projects board with an exported YAML or JSON file')
+    @app_commands.describe(file='File created by /export_board')
+    @metrics.instrument_command
+    async def import_board(interaction: discord.Interaction, file: discord.Attachment):
+        async def work(proj_info):
+            if interaction.user.id != OWNER_USER_ID:
+                return Reply('Only the owner can import the projects board.', ephemeral=True)
+            if file.size > board_io.MAX_IMPORT_BYTES:
+                return Reply(f'Import rejected: the file is larger than {board_io.MAX_IMPORT_BYTES // 1024} KiB.', ephemeral=True)
+
+            try:
+                board = board_io.load_board((await file.read()).decode('utf-8'))
+            except UnicodeDecodeError:
+                return Reply('Import rejected: the file is not UTF-8 text.', ephemeral=True)
+            except ValueError as e:
+                return Reply(f'Import rejected: {e}', ephemeral=True)
+
+            await proj_info.replace_board(board)
+            return Reply(f'Imported {len(board)} projects.')
+
+        await respond(interaction, with_board(boards, interaction, work))
+
+
+def add_cmd_memory_report(tree: app_commands.CommandTree):
+    """ Add the memory_report command to the command tree
+    
+    Command description: Report the bot's memory use
+    
+    Access: Owner
+    
+    :param tree: Command tree
+    :return: None
+    """
+    @tree.command(name='memory_report', description="Report the bot's memory use")
+    @metrics.instrument_command
+    async def memory_report_command(interaction: discord.Interaction):
+        async def work():
+            if interaction.user.id != OWNER_USER_ID:
+                return Reply('Only the owner can see the memory report.', ephemeral=True)
+            snapshot = memory_report.memory_snapshot(interaction.client)
+            return Reply(f'```\n{memory_report.format_memory_report(snapshot)}\n```', ephemeral=True)
+
+        await respond(interaction, work(), ephemeral=True)
+
+
+def add_cmd_my_projects(tree: app_commands.CommandTree, boards: Board_Registry):
+    """ Add the my_projects command to the command tree
+    
+    Command description: List the projects you, or another member, belong to
+    
+    Access: All users
+    
+    :param tree: Command tree
+    :param boards: Board_Registry of the bot
+    :return: None
+    """
+    @tree.command(name='my_projects', description='List the projects you, or another member, belong to')
+    @app_commands.describe(member='Member to look up instead of yourself')
+    @metrics.instrument_command
+    async def my_projects(interaction: discord.Interaction, member: Optional[discord.User] = None):
+        async def work(proj_info):
+            user = member if member is not None else interaction.user
+            administered, contributed = await proj_info.get_user_projects(user.id)
+            if not administered and not contributed:
+                return Reply(f'{user.mention} is not on any project.', ephemeral=True)
+            lines = []
+            if administered:
+                lines.append(f'Admin of: {join_limited(administered, MAX_LIST_LENGTH // 2)}')
+            if contributed:
+                lines.append(f'Contributor to: {join_limited(contributed, MAX_LIST_LENGTH // 2)}')
+            return Reply(f'Projects of {user.mention}\n' + '\n'.join(lines), ephemeral=True)
+
+        await respond(interaction, with_board(boards, interaction, work), ephemeral=True)
+
+
+def add_cmd_project_members(tree: app_commands.CommandTree, boards: Board_Registry):
+    """ Add the project_members command to the command tree
+    
+    Command description: List the admin and members of a project
+    
+    Access: All users
+    
+    :param tree: Command tree
+    :param boards: Board_Registry of the bot
+    :return: None
+    """
+    @tree.command(name='project_members', description='List the admin and members of a project')
+    @app_commands.describe(pname='Project name')
+    @app_commands.autocomplete(pname=project_name_autocomplete(boards))
+    @metrics.instrument_command
+    async def project_members(interaction: discord.Interaction, pname: str):
+        async def work(proj_info):
+            members = await proj_info.get_proj_members(pname)
+            if members is None:
+                return Reply(f'Project {pname} does not exist.', ephemeral=True)
+            admin_id, contributor_ids = members
+            admin = f'<@{admin_id}>' if admin_id else 'none'
+            contributors = join_limited(f'<@{user_id}>' for user_id in contributor_ids) or 'none'
+            return Reply(f'Project {pname}\nAdmin: {admin}\nMembers: {contributors}', ephemeral=True)
+
+        await respond(interaction, with_board(boards, interaction, work), ephemeral=True)
+
+
+def add_cmd_search_projects(tree: app_commands.CommandTree, boards: Board_Registry):
+    """ Add the search_projects command to the command tree
+    
+    Command description: Search project names and descriptions
+    
+    Access: All users
+    
+    :param tree: Command tree
+    :param boards: Board_Registry of the bot
+    :return: None
+    """
+    @tree.command(name='search_projects', description='Search project names and descriptions')
+    @app_commands.describe(query='Words to look for, e.g. compiler or web')
+    @metrics.instrument_command
+    async def search_projects(interaction: discord.Interaction, query: str):
+        async def work(proj_info):
+            results = await proj_info.search_projects(query, MAX_SEARCH_RESULTS)
+            if not results:
+                return Reply(f'No projects match "{query}".', ephemeral=True)
+            lines = [f'Projects matching "{query}":']
+            length = len(lines[0])
+            for name, description in results:
+                if len(description) > SEARCH_SNIPPET_LENGTH:
+                    description = description[:SEARCH_SNIPPET_LENGTH - 1] + '…'
+                line = f'**{name}**: {description}' if description else f'**{name}**'
+                length += len(line) + 1
+                if length > MAX_LIST_LENGTH:
+                    break
+                lines.append(line)
+            return Reply('\n'.join(lines))
+
+        await respond(interaction, with_board(boards, interaction, work))
+
+
+def add_commands(tree: app_commands.CommandTree, boards: Board_Registry, owner_user_id: int,
+                 response_budget: float = RESPONSE_BUDGET, command_timeout: float = COMMAND_TIMEOUT):
     """ Add commands to the command tree
     
     :param tree: Command tree
-    :param proj_info: Projects_Info object
+    :param boards: Board_Registry of the bot
+    :param owner_user_id: Discord user ID of the bot owner
+    :param response_budget: Seconds a command may take before it defers
+    :param command_timeout: Seconds a deferred command may take before the user is told it is still running
     :return: None
     """
-    add_cmd_see_projects(tree)
-    add_cmd_set_proj_desc(tree, proj_info)
-    add_cmd_get_proj_desc(tree, proj_info)
-    add_cmd_create_project(tree, proj_info)
-    add_cmd_project_add_member(tree, proj_info)
-    add_cmd_project_kick_member(tree, proj_info)
-    add_cmd_remove_project(tree, proj_info)
-    add_cmd_change_proj_admin(tree, proj_info)
-    add_cmd_set_proj_name(tree, proj_info)
+    global OWNER_USER_ID, RESPONSE_BUDGET, COMMAND_TIMEOUT, REQUEST_SCHEDULER
+    OWNER_USER_ID = owner_user_id
+    RESPONSE_BUDGET = response_budget
+    COMMAND_TIMEOUT = command_timeout
+    REQUEST_SCHEDULER = boards.scheduler
+
+    add_cmd_see_projects(tree, boards)
+    add_cmd_set_proj_desc(tree, boards)
+    add_cmd_get_proj_desc(tree, boards)
+    add_cmd_create_project(tree, boards)
+    add_cmd_project_add_member(tree, boards)
+    add_cmd_project_kick_member(tree, boards)
+    add_cmd_remove_project(tree, boards)
+    add_cmd_change_proj_admin(tree, boards)
+    add_cmd_set_proj_name(tree, boards)
+    add_cmd_create_projects(tree, boards)
+    add_cmd_project_add_members(tree, boards)
+    add_cmd_project_kick_members(tree, boards)
+    add_cmd_export_board(tree, boards)
+    add_cmd_import_board(tree, boards)
+    add_cmd_my_projects(tree, boards)
+    add_cmd_project_members(tree, boards)
+    add_cmd_search_projects(tree, boards)
+    add_cmd_memory_report(tree)
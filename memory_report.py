@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import sys
+import tracemalloc
+from typing import Optional
+
+MIB = 1024 * 1024
+# Allocation sites listed in a report
+TOP_ALLOCATIONS = 10
+
+# Periodic log task, see start_logging
+_log_task = None
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    Current resident set size of the process, read from /proc on Linux.
+
+    :return: Bytes, or None where /proc is not available
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """
+    Peak resident set size of the process.
+
+    :return: Bytes, or None where the resource module is not available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def start_tracing():
+    """
+    Start tracing Python allocations, as early as possible so that import-time allocations are counted.
+    Tracing has a memory and CPU cost of its own, so it is only started when configured.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def client_cache_sizes(client) -> dict:
+    """
+    Count the objects discord.py caches for the client.
+
+    :param client: Discord client
+    :return: Dict of cache name to number of cached objects
+    """
+    guilds = client.guilds
+    return {
+        'guilds': len(guilds),
+        'channels': sum(len(guild.channels) for guild in guilds),
+        'members': sum(len(guild.members) for guild in guilds),
+        'users': len(client.users),
+        'messages': len(client.cached_messages),
+    }
+
+
+def memory_snapshot(client=None, top: int = TOP_ALLOCATIONS) -> dict:
+    """
+    Snapshot of the process memory, plus the largest allocation sites while tracemalloc is tracing.
+
+    :param client: Discord client whose caches are counted too, if given
+    :param top: Number of allocation sites to list
+    :return: Dict of measurements, sizes in MiB
+    """
+    def mib(value):
+        return round(value / MIB, 2) if value is not None else None
+
+    snapshot = {'rss_mib': mib(rss_bytes()), 'peak_rss_mib': mib(peak_rss_bytes())}
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot['traced_mib'] = mib(current)
+        snapshot['traced_peak_mib'] = mib(peak)
+        statistics = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        ).statistics('filename')
+        snapshot['top'] = [
+            {'file': stat.traceback[0].filename, 'mib': mib(stat.size), 'blocks': stat.count}
+            for stat in statistics[:top]
+        ]
+    if client is not None:
+        snapshot['cache'] = client_cache_sizes(client)
+    return snapshot
+
+
+def format_memory_report(snapshot: dict) -> str:
+    """
+    Format a memory snapshot for a Discord message.
+
+    :param snapshot: Dict returned by memory_snapshot
+    :return: Report text
+    """
+    lines = [f"RSS {snapshot['rss_mib']} MiB (peak {snapshot['peak_rss_mib']} MiB)"]
+    if 'traced_mib' in snapshot:
+        lines.append(f"Python allocations {snapshot['traced_mib']} MiB (peak {snapshot['traced_peak_mib']} MiB)")
+        for site in snapshot['top']:
+            # The package directory tells the many __init__.py files apart
+            short_name = '/'.join(site['file'].replace(os.sep, '/').split('/')[-2:])
+            lines.append(f"  {site['mib']:8.2f} MiB  {site['blocks']:7d} blocks  {short_name}")
+    else:
+        lines.append('Allocation tracing is off, set trace_memory to list allocation sites')
+    if 'cache' in snapshot:
+        lines.append('Cached ' + ', '.join(f'{count} {name}' for name, count in snapshot['cache'].items()))
+    return '\n'.join(lines)
+
+
+def start_logging(interval: float, client=None):
+    """
+    Print a structured JSON line with a memory snapshot every `interval` seconds.
+
+    :param interval: Seconds between log lines
+    :param client: Discord client whose caches are counted too, if given
+    """
+    global _log_task
+    if _log_task is None:
+        _log_task = asyncio.create_task(log_periodically(interval, client))
+
+
+async def log_periodically(interval: float, client=None):
+    while True:
+        await asyncio.sleep(interval)
+        print(json.dumps({'memory': memory_snapshot(client)}))
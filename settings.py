@@ -1,10 +1,14 @@
+from Startup_Timer import startup_timer
 import yaml
 import sys
 import os
-import subprocess
+import json
+from typing import Optional
+from Bot_Config import Bot_Config, parse_board_configs
 
 CONFIG_DIR = "config_files"
 BOT_PATH = "bot.py"
+IN_PROCESS_FLAG = "--in-process"
 
 
 def load_config(config_filename):
@@ -18,7 +22,7 @@ def load_config(config_filename):
     try:
         with open(config_path, "r") as f:
             return yaml.load(f, Loader=yaml.FullLoader)
-    except IOError as e:
+    except IOError:
         print(f"Invalid filename: '{config_filename}'")
         sys.exit(1)
 
@@ -33,6 +37,20 @@ def set_environment_variables(conf_obj) -> bool:
     projects_info_channel_id = conf_obj.get('projects_info_channel_id')
     projects_info_message_id = conf_obj.get('projects_info_message_id')
     owner_user_id = conf_obj.get('owner_user_id')
+    db_path = conf_obj.get('db_path')
+    metrics_port = conf_obj.get('metrics_port')
+    metrics_log_interval = conf_obj.get('metrics_log_interval')
+    response_budget = conf_obj.get('response_budget')
+    command_timeout = conf_obj.get('command_timeout')
+    boards = conf_obj.get('boards')
+    low_memory = conf_obj.get('low_memory')
+    trace_memory = conf_obj.get('trace_memory')
+    memory_log_interval = conf_obj.get('memory_log_interval')
+    sharded = conf_obj.get('sharded')
+    shard_count = conf_obj.get('shard_count')
+    workers = conf_obj.get('workers')
+    lease_path = conf_obj.get('lease_path')
+    lease_duration = conf_obj.get('lease_duration')
     
     if not token_path:
         print("Token path not found in the configuration file.")
@@ -42,23 +60,28 @@ def set_environment_variables(conf_obj) -> bool:
         with open(token_path, "r") as token_file:
             os.environ['DISCORD_TOKEN'] = token_file.read().strip()
         print("Discord token has been set successfully.")
-    except IOError as e:
+    except IOError:
         print(f"Failed to read token from path: '{token_path}'")
         return False
         
-    if projects_info_channel_id:
-        os.environ['PROJECTS_INFO_CHANNEL_ID'] = projects_info_channel_id
-        print("Projects info channel ID has been set successfully.")
+    # Several boards are listed under `boards`, replacing the single board keys
+    if boards:
+        os.environ['PROJECTS_INFO_BOARDS'] = json.dumps(boards)
+        print("Projects info boards have been set successfully.")
     else:
-        print("Projects info channel ID not found in the configuration file.")
-        return False
-    
-    if projects_info_message_id:
-        os.environ['PROJECTS_INFO_MESSAGE_ID'] = projects_info_message_id
-        print("Projects info message ID has been set successfully.")
-    else:
-        print("Projects info message ID not found in the configuration file.")
-        return False
+        if projects_info_channel_id:
+            os.environ['PROJECTS_INFO_CHANNEL_ID'] = projects_info_channel_id
+            print("Projects info channel ID has been set successfully.")
+        else:
+            print("Projects info channel ID not found in the configuration file.")
+            return False
+
+        if projects_info_message_id:
+            os.environ['PROJECTS_INFO_MESSAGE_ID'] = projects_info_message_id
+            print("Projects info message ID has been set successfully.")
+        else:
+            print("Projects info message ID not found in the configuration file.")
+            return False
     
     if owner_user_id:
         os.environ['OWNER_USER_ID'] = owner_user_id
@@ -66,29 +89,143 @@ def set_environment_variables(conf_obj) -> bool:
     else:
         print("Owner user ID not found in the configuration file.")
         return False
+
+    # Optional: back the projects info board with a local SQLite database
+    if db_path:
+        os.environ['PROJECTS_DB_PATH'] = db_path
+        print("Projects database path has been set successfully.")
+
+    # Optional: expose metrics on a local Prometheus endpoint and/or as periodic log lines
+    if metrics_port:
+        os.environ['METRICS_PORT'] = str(metrics_port)
+    if metrics_log_interval:
+        os.environ['METRICS_LOG_INTERVAL'] = str(metrics_log_interval)
+
+    # Optional: response deadline tuning for commands
+    if response_budget:
+        os.environ['RESPONSE_BUDGET'] = str(response_budget)
+    if command_timeout:
+        os.environ['COMMAND_TIMEOUT'] = str(command_timeout)
+
+    # Optional: low-footprint client and memory reporting
+    if low_memory:
+        os.environ['LOW_MEMORY'] = '1'
+    if trace_memory:
+        os.environ['TRACE_MEMORY'] = '1'
+    if memory_log_interval:
+        os.environ['MEMORY_LOG_INTERVAL'] = str(memory_log_interval)
+
+    # Optional: sharded gateway connections, spread over several worker processes
+    if sharded:
+        os.environ['SHARDED'] = '1'
+    if shard_count:
+        os.environ['SHARD_COUNT'] = str(shard_count)
+    if workers:
+        os.environ['WORKERS'] = str(workers)
+    if lease_path:
+        os.environ['LEASE_PATH'] = lease_path
+    if lease_duration:
+        os.environ['LEASE_DURATION'] = str(lease_duration)
     
     return True
     
 
+def build_config(conf_obj) -> Optional[Bot_Config]:
+    """
+    Build a typed configuration from the configuration object.
+    
+    :param conf_obj: Configuration object
+    :return: Bot_Config, or None if the configuration is incomplete
+    """
+    token_path = conf_obj.get('token_path')
+    if not token_path:
+        print("Token path not found in the configuration file.")
+        return None
+
+    try:
+        with open(token_path, "r") as token_file:
+            token = token_file.read().strip()
+    except IOError:
+        print(f"Failed to read token from path: '{token_path}'")
+        return None
+
+    try:
+        boards = parse_board_configs(conf_obj.get('boards') or ())
+        return Bot_Config(
+            token=token,
+            projects_info_channel_id=None if boards else int(conf_obj['projects_info_channel_id']),
+            projects_info_message_id=None if boards else int(conf_obj['projects_info_message_id']),
+            owner_user_id=int(conf_obj['owner_user_id']),
+            db_path=conf_obj.get('db_path'),
+            metrics_port=int(conf_obj['metrics_port']) if conf_obj.get('metrics_port') else None,
+            metrics_log_interval=float(conf_obj['metrics_log_interval']) if conf_obj.get('metrics_log_interval') else None,
+            response_budget=float(conf_obj.get('response_budget', Bot_Config.response_budget)),
+            command_timeout=float(conf_obj.get('command_timeout', Bot_Config.command_timeout)),
+            boards=boards,
+            low_memory=bool(conf_obj.get('low_memory')),
+            trace_memory=bool(conf_obj.get('trace_memory')),
+            memory_log_interval=float(conf_obj['memory_log_interval']) if conf_obj.get('memory_log_interval') else None,
+            sharded=bool(conf_obj.get('sharded')),
+            shard_count=int(conf_obj['shard_count']) if conf_obj.get('shard_count') else None,
+            workers=int(conf_obj.get('workers') or Bot_Config.workers),
+            lease_path=conf_obj.get('lease_path') or Bot_Config.lease_path,
+            lease_duration=float(conf_obj.get('lease_duration') or Bot_Config.lease_duration),
+        )
+    except KeyError as e:
+        print(f"{e} not found in the configuration file.")
+    except (TypeError, ValueError) as e:
+        print(f"Invalid value in the configuration file: {e}")
+    return None
+
+
 def execute_script(script_path):
     """
     Execute a Python script from the given file path using subprocess.
     
     :param script_path: Path to the Python script
     """
+    import subprocess
     result = subprocess.run([sys.executable, script_path], check=True)
     if result.returncode != 0:
         print(f"Script {script_path} exited with code {result.returncode}")
         sys.exit(result.returncode)
 
 
+def run_in_process(conf_obj):
+    """
+    Run the bot in this interpreter instead of spawning a second one.
+    
+    :param conf_obj: Configuration object
+    """
+    config = build_config(conf_obj)
+    if config is None:
+        return
+    if config.trace_memory:
+        # Before importing bot, so that the allocations of discord's import are traced too
+        import memory_report
+        memory_report.start_tracing()
+    startup_timer.mark('config loaded')
+
+    # Deferred so that discord is only imported once the configuration is valid
+    import bot
+    bot.main(config)
+
+
 def main():
-    if len(sys.argv) != 2:
-        print("Expected config filename.")
+    args = sys.argv[1:]
+    in_process = IN_PROCESS_FLAG in args
+    if in_process:
+        args.remove(IN_PROCESS_FLAG)
+
+    if len(args) != 1:
+        print(f"Expected config filename, optionally with {IN_PROCESS_FLAG}.")
         return
 
-    config_filename = sys.argv[1]
+    config_filename = args[0]
     conf_obj = load_config(config_filename)
+    if in_process:
+        run_in_process(conf_obj)
+        return
     if not set_environment_variables(conf_obj):
         return
     execute_script(BOT_PATH)